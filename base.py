@@ -1,9 +1,28 @@
+import codecs
+import contextlib
+import copy
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import re
 import string
+import struct
+import sys
+import time
+import warnings
+import weakref
+import zlib
+from array import array
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 
-from tabulate import tabulate
-
-symbol_table = {}
+__version__ = "0.2.0"
 
 
 class Empty:
@@ -70,6 +89,35 @@ class InvalidSemantic(Error):
     pass
 
 
+class LeftRecursion(InvalidSemantic):
+    def __init__(self, cycles) -> None:
+        # one cycle of non-terminals for every left recursive component
+        self.cycles = cycles
+        message = "; ".join(
+            " -> ".join(f"<{symbol.value}>" for symbol in cycle + cycle[:1])
+            for cycle in cycles
+        )
+        super().__init__(f"Grammar have left recursion in {message}")
+
+
+class UselessSymbolWarning(UserWarning):
+    def __init__(self, non_productive, unreachable, rules) -> None:
+        # non-terminals deriving no terminal string, the ones the start symbol
+        # never reaches and every (left, rights) rule left out because of them
+        self.non_productive = non_productive
+        self.unreachable = unreachable
+        self.rules = rules
+        message = f"{len(rules)} useless rules left out, the rest are renumbered"
+        for name, symbols in (
+            ("non productive", non_productive),
+            ("unreachable", unreachable),
+        ):
+            if symbols:
+                names = ", ".join(f"<{symbol.value}>" for symbol in symbols)
+                message += f"; {name}: {names}"
+        super().__init__(message)
+
+
 class InvalidLL1Grammar(Exception):
     message = "Grammar is not LL1"
 
@@ -96,17 +144,35 @@ class InputFileManager:
 
 
 class Lexeme:
-    def __init__(self, value, type) -> None:
-        self.value = value
-        self.type = type
+    # one interned object per (value, type), so equal lexemes are usually the
+    # same object and dict or set probes never reach __eq__; only weakly held,
+    # so the names of grammars no longer used are freed
+    __slots__ = ("value", "type", "hash_value", "__weakref__")
+    interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, value, type):
+        lexeme = cls.interned.get((value, type))
+        if lexeme is None:
+            lexeme = super().__new__(cls)
+            lexeme.value = value
+            lexeme.type = type
+            lexeme.hash_value = hash(value)
+            lexeme = cls.interned.setdefault((value, type), lexeme)
+        return lexeme
+
+    def __reduce__(self):
+        return (Lexeme, (self.value, self.type))
 
     def __repr__(self) -> str:
         return f"Lexeme({self.value},{self.type})"
 
     def __hash__(self) -> int:
-        return hash(self.value)
+        return self.hash_value
 
     def __eq__(self, __o: object) -> bool:
+        if self is __o:
+            return True
+        # compatibility with lexemes of another type and plain strings
         if isinstance(__o, Lexeme):
             return self.value == __o.value
         if isinstance(__o, str):
@@ -123,83 +189,201 @@ class Lexeme:
 epsilon = Lexeme("epsilon", LexemeTypes.TERMINAL)
 input_end = Lexeme("$", LexemeTypes.TERMINAL)
 synch = Lexeme("synch", LexemeTypes.SYNCH)
+end_token = (LexemeTypes.END, empty, -1)
+
+
+TERMINAL_CHARS = frozenset(string.ascii_letters + string.digits + "*&!@#%^()_+=-`~'\"")
+WHITESPACE_CHARS = frozenset(string.whitespace)
+WHITESPACE = re.compile(f"[{re.escape(string.whitespace)}]+")
+NON_TERMINAL_NAME = re.compile(f"[{re.escape(''.join(sorted(TERMINAL_CHARS)))}]*")
+
+
+class Stats:
+    # optional instrumentation for LexicalAnalyzer, SyntaxAnalyzer and
+    # LL1Machine, callback(phase, seconds) is called every time a phase ends;
+    # not thread safe, so threads sharing a Grammar should not share one.
+    # Phase times are not exclusive: "lex" runs inside "parse_rules"
+    def __init__(self, callback=None) -> None:
+        self.callback = callback
+        self.times = {}
+        self.counts = {}
+        # names of the counts that are high water marks, not totals
+        self.maxima = set()
+        # LL1Machine expansions per rule id
+        self.production_hits = []
+
+    def add_time(self, phase, seconds) -> None:
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+        if self.callback:
+            self.callback(phase, seconds)
+
+    def count(self, name, value=1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def high_water(self, name, value) -> None:
+        self.maxima.add(name)
+        if value > self.counts.get(name, 0):
+            self.counts[name] = value
+
+    def merge(self, other) -> None:
+        # adds the Stats of other, e.g. one of a worker process, to these
+        for phase, seconds in other.times.items():
+            self.add_time(phase, seconds)
+        for name, value in other.counts.items():
+            if name in other.maxima:
+                self.high_water(name, value)
+            else:
+                self.count(name, value)
+        hits = self.hits(len(other.production_hits))
+        for rule_id, value in enumerate(other.production_hits):
+            hits[rule_id] += value
+
+    def hits(self, size) -> list:
+        if len(self.production_hits) < size:
+            self.production_hits += [0] * (size - len(self.production_hits))
+        return self.production_hits
+
+    def as_dict(self) -> dict:
+        return {
+            "times": dict(self.times),
+            "counts": dict(self.counts),
+            "production_hits": list(self.production_hits),
+        }
+
+    def __repr__(self) -> str:
+        return f"Stats({self.times},{self.counts})"
+
+
+def run_phase(stats, phase, function):
+    if stats is None:
+        return function()
+    start = time.perf_counter()
+    try:
+        return function()
+    finally:
+        stats.add_time(phase, time.perf_counter() - start)
 
 
 class LexicalAnalyzer:
-    def __init__(self, input_manager) -> None:
+    def __init__(self, input_manager=None, stats=None) -> None:
         self.input_manager = input_manager
         if not input_manager:
-            self.input_manager = InputFileManager()
+            self.input_manager = InputFileManager("")
+        self.stats = stats
 
         self.lexeme_begin = 0
         self.line_number = 0
         self.last_line_start = 0
+        # one string object per non-terminal name
+        self.names = {}
 
-    def scan_non_terminal(self) -> Lexeme:
+    def scan_non_terminal(self) -> str:
+        text = self.input_manager.input
         self.lexeme_begin = self.input_manager.forward
-        while True:
-            char = self.input_manager.next_char()
-            if (
-                char
-                not in string.ascii_letters + string.digits + ">*&!@#%^*()_+=-`~'\""
-            ):
-                token = self.input_manager.input[
-                    self.lexeme_begin : self.input_manager.forward - 1
-                ]
-                token += ">"
-                InvalidToken(token, self).throw()
-            if char == ">":
-                value = self.input_manager.input[
-                    self.lexeme_begin + 1 : self.input_manager.forward
-                ]
-                return Lexeme(value, LexemeTypes.NON_TERMINAL)
+        name_end = NON_TERMINAL_NAME.match(text, self.lexeme_begin + 1).end()
+        # the input always ends with a newline, so name_end is a valid index
+        self.input_manager.forward = name_end
+        if text[name_end] != ">":
+            token = text[self.lexeme_begin : name_end - 1] + ">"
+            InvalidToken(token, self).throw()
+        name = text[self.lexeme_begin + 1 : name_end]
+        return self.names.setdefault(name, name)
 
     def scan_one_comment(self) -> None:
         if self.input_manager.next_char() != "/":
             InvalidToken("//", self).throw()
-        while True:
-            if self.input_manager.next_char() == "\n":
-                return self.input_manager.retract()
+        # stop before the newline so get_token counts the line
+        text = self.input_manager.input
+        self.input_manager.forward = text.index("\n", self.input_manager.forward) - 1
 
     def scan_multiple_comment(self) -> None:
+        text = self.input_manager.input
+        comment_end = text.find("}", self.input_manager.forward)
+        if comment_end == -1:
+            self.input_manager.forward = len(text) - 1
+            InvalidToken("}", self).throw()
+        self.input_manager.forward = comment_end
+
+    def scan_whitespace(self) -> None:
+        text = self.input_manager.input
+        start = self.input_manager.forward
+        run_end = WHITESPACE.match(text, start).end()
+        newlines = text.count("\n", start, run_end)
+        if newlines:
+            self.line_number += newlines
+            self.last_line_start = text.rindex("\n", start, run_end)
+        self.input_manager.forward = run_end - 1
+
+    def get_token(self) -> Lexeme:
+        token_type, value, _ = self.scan()
+        return Lexeme(value, token_type)
+
+    def tokens(self):
+        # (type, value, offset) tuples, ending with a single END token
+        if self.stats is not None:
+            yield from self.traced_tokens()
+            return
         while True:
-            if self.input_manager.next_char() == "}":
+            token = self.scan()
+            yield token
+            if token[0] == LexemeTypes.END:
                 return
 
-    def get_token(self) -> Lexeme:
+    def traced_tokens(self):
+        # the totals are added before END is yielded, parsers stop reading there
+        count = 0
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                token = self.scan()
+                seconds += time.perf_counter() - start
+                if token[0] == LexemeTypes.END:
+                    break
+                count += 1
+                yield token
+        finally:
+            self.stats.count("tokens", count)
+            self.stats.add_time("lex", seconds)
+        yield token
+
+    def scan(self):
+        input_manager = self.input_manager
+        text = input_manager.input
+        end = len(text)
         while True:
-            if self.input_manager.is_ended():
-                return Lexeme(empty, LexemeTypes.END)
+            forward = input_manager.forward + 1
+            if forward >= end:
+                return (LexemeTypes.END, empty, forward)
 
-            char = self.input_manager.next_char()
+            char = text[forward]
+            input_manager.forward = forward
 
             if char == "-":
-                if self.input_manager.next_char() != ">":
+                if input_manager.next_char() != ">":
                     InvalidToken("->", self).throw()
-                return Lexeme("->", LexemeTypes.ASSIGN)
+                return (LexemeTypes.ASSIGN, "->", forward)
+            elif char in TERMINAL_CHARS:
+                return (LexemeTypes.TERMINAL, char, forward)
+            elif char in WHITESPACE_CHARS:
+                self.scan_whitespace()
+            elif char == "<":
+                return (LexemeTypes.NON_TERMINAL, self.scan_non_terminal(), forward)
             elif char == ";":
-                return Lexeme(";", LexemeTypes.INSTRUCTION_END)
+                return (LexemeTypes.INSTRUCTION_END, ";", forward)
+            elif char == "|":
+                return (LexemeTypes.OR, "|", forward)
             elif char == "/":
                 self.scan_one_comment()
-            elif char == "|":
-                return Lexeme("|", LexemeTypes.OR)
             elif char == "{":
                 self.scan_multiple_comment()
-            elif char in string.ascii_letters + string.digits + "*&!@#%^*()_+=-`~'\"":
-                return Lexeme(char, LexemeTypes.TERMINAL)
             elif char == "\\":
-                char = self.input_manager.next_char()
+                char = input_manager.next_char()
                 if char == "w":
-                    return Lexeme(" ", LexemeTypes.TERMINAL)
+                    return (LexemeTypes.TERMINAL, " ", forward)
                 elif char == "e":
-                    return Lexeme("epsilon", LexemeTypes.TERMINAL)
+                    return (LexemeTypes.TERMINAL, "epsilon", forward)
                 InvalidToken("\\w or \\e", self).throw()
-            elif char == "<":
-                return self.scan_non_terminal()
-            elif char in string.whitespace:
-                if char == "\n":
-                    self.line_number += 1
-                    self.last_line_start = self.input_manager.forward
             else:
                 InvalidCharacter(self).throw()
 
@@ -210,6 +394,7 @@ class SyntaxAnalyzerBase:
         if not lexical_analyzer:
             self.analyzer = LexicalAnalyzer()
         self.look_ahead = look_ahead
+        self.tokens = None
 
     def match(self, lex_type, value=None, raise_error=False):
         self.next()
@@ -233,156 +418,1496 @@ class SyntaxAnalyzerBase:
                 InvalidSyntax(*args).throw()
 
     def next(self):
-        self.look_ahead = self.analyzer.get_token()
+        if self.tokens is None:
+            self.tokens = self.analyzer.tokens()
+        token_type, value, _ = next(self.tokens, end_token)
+        self.look_ahead = Lexeme(value, token_type)
 
     def parse(self):
         # subclasses have to provide this method
         raise NotImplemented()
 
 
+class TerminalIds(dict):
+    # characters that no rule mentions map to the extra "other" column
+    def __init__(self, other) -> None:
+        super().__init__()
+        self.other = other
+
+    def __missing__(self, key) -> int:
+        return self.other
+
+
+class ParseTable:
+    ERROR = -1
+    SYNCH = -2
+    EPSILON = -1
+    # every attribute of a table, they are part of the cache key so tables
+    # pickled with another layout are never loaded
+    FIELDS = (
+        "valid_ll1",
+        "terminals",
+        "non_terminals",
+        "n_terminals",
+        "width",
+        "terminal_ids",
+        "char_ids",
+        "end",
+        "non_terminal_ids",
+        "productions",
+        "lefts",
+        "pushes",
+        "start",
+        "cells",
+    )
+
+    def __init__(self, rules, rule_table, valid_ll1=True) -> None:
+        self.valid_ll1 = valid_ll1
+
+        # terminal ids: "$" is always 0, non-terminal ids follow the terminals
+        self.terminals = [input_end.value]
+        for _, rights in rules:
+            for symbol in rights:
+                if symbol.type == LexemeTypes.TERMINAL and symbol != epsilon:
+                    self.add_terminal(symbol.value)
+        for row in rule_table.values():
+            for terminal in row:
+                self.add_terminal(terminal.value)
+
+        self.non_terminals = []
+        for left, _ in rules:
+            if left.value not in self.non_terminals:
+                self.non_terminals.append(left.value)
+
+        self.n_terminals = len(self.terminals)
+        self.width = self.n_terminals + 1
+        self.terminal_ids = TerminalIds(self.n_terminals)
+        self.terminal_ids.update((t, i) for i, t in enumerate(self.terminals))
+        # what input characters map to, "$" in the input is not the input end
+        self.char_ids = TerminalIds(self.n_terminals)
+        self.char_ids.update(self.terminal_ids)
+        del self.char_ids[input_end.value]
+        self.end = self.terminal_ids[input_end.value]
+        self.non_terminal_ids = {
+            n: self.n_terminals + i for i, n in enumerate(self.non_terminals)
+        }
+
+        self.productions = [
+            tuple(self.symbol_id(symbol) for symbol in rights) for _, rights in rules
+        ]
+        self.lefts = array(
+            "i", (self.non_terminal_ids[left.value] for left, _ in rules)
+        )
+        # bodies reversed once so an expansion is a single stack.extend,
+        # epsilon never reaches the stack
+        self.pushes = [
+            tuple(i for i in reversed(body) if i != self.EPSILON)
+            for body in self.productions
+        ]
+        self.start = self.non_terminal_ids[rules[0][0].value]
+
+        self.cells = array("i", [self.ERROR]) * (len(self.non_terminals) * self.width)
+        for left, row in rule_table.items():
+            base = (self.non_terminal_ids[left.value] - self.n_terminals) * self.width
+            for terminal, rule_ids in row.items():
+                rule_id = rule_ids[0]
+                self.cells[base + self.terminal_ids[terminal.value]] = (
+                    self.SYNCH if rule_id == synch else rule_id
+                )
+
+    def add_terminal(self, value) -> None:
+        if value not in self.terminals:
+            self.terminals.append(value)
+
+    def symbol_id(self, symbol) -> int:
+        if symbol.type == LexemeTypes.NON_TERMINAL:
+            return self.non_terminal_ids[symbol.value]
+        if symbol == epsilon:
+            return self.EPSILON
+        return self.terminal_ids[symbol.value]
+
+    def expected(self, non_terminal_id) -> tuple:
+        base = (non_terminal_id - self.n_terminals) * self.width
+        return tuple(
+            terminal
+            for i, terminal in enumerate(self.terminals)
+            if self.cells[base + i] >= 0
+        )
+
+    def lookup(self, non_terminal, terminal) -> int:
+        row = self.non_terminal_ids[non_terminal] - self.n_terminals
+        return self.cells[row * self.width + self.terminal_ids[terminal]]
+
+    def byte_ids(self):
+        # char_ids as a bytes.translate table, None unless every terminal is a
+        # single byte; non ascii bytes can never match so utf-8 verdicts agree
+        if self.width > 256 or any(ord(t) > 127 for t in self.terminals[1:]):
+            return None
+        ids = bytes(self.char_ids[chr(b)] for b in range(128))
+        return ids + bytes([self.n_terminals]) * 128
+
+
+class Recovery(Enum):
+    POP = "pop"
+    RESET = "reset"
+    SKIP = "skip"
+    SYNCH = "synch"
+
+
+class ErrorRecord:
+    def __init__(self, position, char, expected, action) -> None:
+        self.position = position
+        self.char = char
+        self.expected = expected
+        self.action = action
+
+    def __repr__(self) -> str:
+        return f"ErrorRecord({self.position},{self.char!r},{self.action.name})"
+
+    def __str__(self) -> str:
+        if self.action in (Recovery.POP, Recovery.RESET):
+            return f"Expected '{self.expected[0]}' but got '{self.char}' in character number {self.position}"
+        if self.action == Recovery.SKIP:
+            return f"SyntaxError: can not parse '{self.char}' in character number {self.position}, skipping it"
+        return f"SyntaxError: can not parse '{self.char}' in character number {self.position}, trying new rule"
+
+
+class ParseResult:
+    def __init__(self, accepted, errors, limit=None) -> None:
+        self.accepted = accepted
+        self.errors = errors
+        # the Limit that stopped the machine, the input is then rejected
+        self.limit = limit
+
+    def __bool__(self) -> bool:
+        return self.accepted
+
+    def __repr__(self) -> str:
+        if self.limit is not None:
+            return f"ParseResult({self.accepted},{self.errors},{self.limit.name})"
+        return f"ParseResult({self.accepted},{self.errors})"
+
+
+UNBOUNDED = sys.maxsize
+# steps plus characters between two looks at the clock
+CLOCK_STEPS = 1024
+
+
+class Limit(Enum):
+    STACK = "stack"
+    STEPS = "steps"
+    TIME = "time"
+    RECOVERIES = "recoveries"
+
+
+class Limits:
+    # bounds on the work done for one input, None leaves one unbounded. Steps
+    # are rule expansions, max_steps_per_char of them per character read so
+    # far so one character can still take many; the stack and the steps are
+    # checked at every expansion, including the ones made for the end of the
+    # input. time_budget is in seconds per input, deadline a time.monotonic()
+    # time shared by every input, e.g. the ones of one request
+    def __init__(
+        self,
+        max_stack=None,
+        max_steps_per_char=None,
+        time_budget=None,
+        max_recoveries=None,
+        deadline=None,
+    ) -> None:
+        self.max_stack = max_stack
+        self.max_steps_per_char = max_steps_per_char
+        self.time_budget = time_budget
+        self.max_recoveries = max_recoveries
+        self.deadline = deadline
+
+    def until(self, deadline):
+        # the same limits for inputs that must also end by deadline
+        return Limits(
+            self.max_stack,
+            self.max_steps_per_char,
+            self.time_budget,
+            self.max_recoveries,
+            deadline,
+        )
+
+    def bounds(self):
+        # (max_stack, steps per char, clock, deadline, max_recoveries) for an
+        # input starting now, the clock is the steps plus characters count of
+        # the next look at the time; unbounded ones are UNBOUNDED
+        def bound(value):
+            return UNBOUNDED if value is None else value
+
+        clock, deadline = UNBOUNDED, self.deadline
+        if self.time_budget is not None:
+            budget_end = time.monotonic() + self.time_budget
+            deadline = budget_end if deadline is None else min(deadline, budget_end)
+        if deadline is not None:
+            # the first character looks at the time, a shared deadline may
+            # have passed already
+            clock = 0
+        return (
+            bound(self.max_stack),
+            bound(self.max_steps_per_char),
+            clock,
+            deadline,
+            bound(self.max_recoveries),
+        )
+
+
+NO_LIMITS = Limits()
+
+
+class Derivation:
+    # leftmost derivation of an accepted input: the production id of every
+    # expansion in order, which is the preorder of the parse tree, and the
+    # input offset each one was made at; nodes are only built by tree()
+    def __init__(self, table, productions, offsets, length) -> None:
+        self.table = table
+        self.productions = productions
+        self.offsets = offsets
+        self.length = length
+        self.ends = None
+        self.sizes = None
+
+    def __len__(self) -> int:
+        return len(self.productions)
+
+    def __repr__(self) -> str:
+        return f"Derivation({len(self.productions)} expansions)"
+
+    def tree(self):
+        return ParseNode(self, 0)
+
+    def subtrees(self):
+        # per expansion, the index after its subtree and the number of input
+        # characters it covers, computed once from the end of the derivation
+        if self.ends is None:
+            table = self.table
+            n_terminals = table.n_terminals
+            children = []
+            leaves = []
+            for body in table.productions:
+                children.append(sum(1 for i in body if i >= n_terminals))
+                leaves.append(sum(1 for i in body if 0 <= i < n_terminals))
+            ends = array("i", bytes(4 * len(self.productions)))
+            sizes = array("i", ends)
+            done = []
+            for index in range(len(self.productions) - 1, -1, -1):
+                rule_id = self.productions[index]
+                end = index + 1
+                size = leaves[rule_id]
+                for _ in range(children[rule_id]):
+                    child_end, child_size = done.pop()
+                    end = child_end
+                    size += child_size
+                ends[index] = end
+                sizes[index] = size
+                done.append((end, size))
+            self.ends = ends
+            self.sizes = sizes
+        return self.ends, self.sizes
+
+
+class ParseNode:
+    __slots__ = ("derivation", "index")
+
+    def __init__(self, derivation, index) -> None:
+        self.derivation = derivation
+        self.index = index
+
+    @property
+    def rule(self) -> int:
+        return self.derivation.productions[self.index]
+
+    @property
+    def symbol(self) -> str:
+        table = self.derivation.table
+        return table.non_terminals[table.lefts[self.rule] - table.n_terminals]
+
+    @property
+    def start(self) -> int:
+        return self.derivation.offsets[self.index]
+
+    @property
+    def end(self) -> int:
+        return self.start + self.derivation.subtrees()[1][self.index]
+
+    @property
+    def children(self) -> list:
+        derivation = self.derivation
+        table = derivation.table
+        ends = derivation.subtrees()[0]
+        children = []
+        child = self.index + 1
+        offset = self.start
+        for symbol in table.productions[self.rule]:
+            if symbol >= table.n_terminals:
+                node = ParseNode(derivation, child)
+                children.append(node)
+                child = ends[child]
+                offset = node.end
+            elif symbol >= 0:
+                children.append(ParseLeaf(table.terminals[symbol], offset))
+                offset += 1
+        return children
+
+    def __repr__(self) -> str:
+        return f"ParseNode(<{self.symbol}>,{self.rule},{self.start}:{self.end})"
+
+
+class ParseLeaf:
+    __slots__ = ("value", "offset")
+
+    def __init__(self, value, offset) -> None:
+        self.value = value
+        self.offset = offset
+
+    def __repr__(self) -> str:
+        return f"ParseLeaf({self.value!r},{self.offset})"
+
+
 class LL1Machine:
-    def __init__(self, syntax_analyzer):
-        self.rule_table = syntax_analyzer.rule_table
+    def __init__(self, syntax_analyzer=None, table=None, stats=None, limits=None):
+        # a compiled table is self-contained, so machines can be rebuilt from it
+        # in other processes without the analyzer or the symbol table
+        self.rule_table = None
+        if table is None:
+            self.rule_table = syntax_analyzer.rule_table
+            table = ParseTable(
+                syntax_analyzer.rules, self.rule_table, syntax_analyzer.valid_ll1
+            )
+        self.table = table
+        # with stats the traced_* variants run instead of the fast paths
+        self.stats = stats
+        # with limits every input goes through limited_run() and the verdicts
+        # are ParseResults telling which Limit, if any, stopped it
+        self.limits = limits
 
     def parse(self, input_text):
-        input_text = input_text + "$"
-        first_rule = symbol_table["rules"][0][0]
-        stack = [Lexeme("$", LexemeTypes.TERMINAL), first_rule]
-        result = True
-        for count, char in enumerate(input_text, 1):
+        return self.run(input_text, [])
+
+    def parse_lines(self, lines):
+        # one stack is reused for every line, run() resets it in place
+        stack = []
+        for line in lines:
+            yield self.run(line.rstrip("\r\n"), stack)
+
+    def parse_stream(self, source, chunk_size=1 << 16):
+        # source is a file object (text or binary, e.g. socket.makefile("rb")) or
+        # an iterable of str/bytes chunks, only the parse stack is kept in memory
+        chunks = decode_chunks(read_chunks(source, chunk_size))
+        if self.limits is not None:
+            terms = map(self.table.char_ids.__getitem__, chain.from_iterable(chunks))
+            return self.limited_run(chain(terms, (self.table.end,)), [])
+        start = time.perf_counter()
+        stack = self.reset([])
+        accepted = all(
+            self.feed(stack, map(self.table.char_ids.__getitem__, chunk))
+            for chunk in chunks
+        ) and self.finish(stack)
+        return self.account(start, accepted)
+
+    def parse_bytes(self, data, chunk_size=1 << 16):
+        # data is any buffer, e.g. an mmap, validated a translated chunk at a
+        # time without decoding it
+        ids = self.byte_table()
+        with memoryview(data) as view:
+            chunks = (
+                view[start : start + chunk_size].tobytes().translate(ids)
+                for start in range(0, len(view), chunk_size)
+            )
+            if self.limits is not None:
+                terms = chain(chain.from_iterable(chunks), (self.table.end,))
+                return self.limited_run(terms, [])
+            started = time.perf_counter()
+            stack = self.reset([])
+            accepted = all(self.feed(stack, chunk) for chunk in chunks)
+        return self.account(started, accepted and self.finish(stack))
+
+    def parse_byte_lines(self, data, start=0, stop=None, chunk_size=1 << 20):
+        # one verdict per line of data[start:stop], data is bytes or an mmap;
+        # only one chunk of it is copied at a time and nothing is decoded
+        ids = self.byte_table()
+        stop = len(data) if stop is None else stop
+        end = (self.table.end,)
+        cr = ord("\r")
+        traced = self.stats is not None
+        stack = []
+        while start < stop:
+            chunk_end = data.find(b"\n", min(start + chunk_size, stop) - 1, stop)
+            chunk_end = stop if chunk_end == -1 else chunk_end + 1
+            # the chunk is translated once and each line is a slice of that,
+            # found by its offsets in the untranslated chunk; slices of bytes
+            # copy a line but iterate faster in feed() than a memoryview
+            chunk = data[start:chunk_end]
+            terms = chunk.translate(ids)
+            line_start = 0
+            while line_start < len(chunk):
+                line_end = chunk.find(b"\n", line_start)
+                next_start = line_end + 1
+                if line_end == -1:
+                    line_end = next_start = len(chunk)
+                while line_end > line_start and chunk[line_end - 1] == cr:
+                    line_end -= 1
+                line = terms[line_start:line_end]
+                line_start = next_start
+                if self.limits is not None:
+                    yield self.limited_run(chain(line, end), stack)
+                    continue
+                started = time.perf_counter() if traced else 0.0
+                self.reset(stack)
+                accepted = (
+                    self.feed(stack, line) and self.feed(stack, end) and not stack
+                )
+                yield self.account(started, accepted) if traced else accepted
+            start = chunk_end
+
+    def parse_file(self, path):
+        with open(path, "rb") as f, map_file(f) as data:
+            return self.parse_bytes(data)
+
+    def parse_file_lines(self, path):
+        with open(path, "rb") as f, map_file(f) as data:
+            yield from self.parse_byte_lines(data)
+
+    def byte_table(self):
+        ids = self.table.byte_ids()
+        if ids is None:
+            raise ValueError("byte input needs single byte (ascii) terminals")
+        return ids
+
+    def reset(self, stack):
+        stack.clear()
+        stack += (self.table.end, self.table.start)
+        return stack
+
+    def run(self, input_text, stack):
+        if self.limits is not None:
+            terms = map(self.table.char_ids.__getitem__, input_text)
+            return self.limited_run(chain(terms, (self.table.end,)), stack)
+        if self.stats is not None:
+            return self.traced_run(input_text, stack)
+        self.reset(stack)
+        if not self.feed(stack, map(self.table.char_ids.__getitem__, input_text)):
+            return False
+        return self.finish(stack)
+
+    def finish(self, stack, rest=""):
+        terms = map(self.table.char_ids.__getitem__, rest)
+        return self.feed(stack, chain(terms, (self.table.end,))) and not stack
+
+    def traced_run(self, input_text, stack):
+        start = time.perf_counter()
+        self.reset(stack)
+        accepted = self.feed(
+            stack, map(self.table.char_ids.__getitem__, input_text)
+        ) and self.finish(stack)
+        return self.account(start, accepted)
+
+    def account(self, start, accepted):
+        # counts one input that started at start (perf_counter) in the stats
+        if self.stats is not None:
+            self.stats.count("inputs")
+            self.stats.count("accepted", accepted)
+            self.stats.add_time("machine", time.perf_counter() - start)
+        return accepted
+
+    def limited_run(self, terms, stack):
+        # parse() of terms, which end with table.end, within self.limits
+        table = self.table
+        cells = table.cells
+        pushes = table.pushes
+        n_terminals = table.n_terminals
+        width = table.width
+        max_stack, per_char, clock, deadline, _ = self.limits.bounds()
+
+        start = time.perf_counter()
+        self.reset(stack)
+        steps = 0
+        for count, term in enumerate(terms, 1):
+            # the stack and the steps are checked at every expansion, the time
+            # only every CLOCK_STEPS steps and characters
+            if steps + count >= clock:
+                clock += CLOCK_STEPS
+                if time.monotonic() > deadline:
+                    return self.limited_result(start, False, Limit.TIME)
             while True:
                 stack_top = stack.pop()
-                if stack_top.type == LexemeTypes.TERMINAL:
-                    if stack_top == epsilon:
-                        continue
-                    if stack_top.value == char:
+                if stack_top < n_terminals:
+                    if stack_top == term:
+                        break
+                    return self.limited_result(start, False)
+
+                rule_id = cells[(stack_top - n_terminals) * width + term]
+                if rule_id < 0:
+                    return self.limited_result(start, False)
+                stack.extend(pushes[rule_id])
+                steps += 1
+                if len(stack) > max_stack:
+                    return self.limited_result(start, False, Limit.STACK)
+                if steps > per_char * count:
+                    return self.limited_result(start, False, Limit.STEPS)
+
+        return self.limited_result(start, not stack)
+
+    def limited_result(self, start, accepted, limit=None):
+        if self.stats is not None and limit is not None:
+            self.stats.count(f"limits_{limit.value}")
+        self.account(start, accepted)
+        return ParseResult(accepted, [], limit)
+
+    def feed(self, stack, terms):
+        # boolean only fast path, any error rejects so it stops at the first one
+        if self.stats is not None:
+            return self.traced_feed(stack, terms)
+        table = self.table
+        cells = table.cells
+        pushes = table.pushes
+        n_terminals = table.n_terminals
+        width = table.width
+
+        for term in terms:
+            while True:
+                stack_top = stack.pop()
+                if stack_top < n_terminals:
+                    if stack_top == term:
+                        break
+                    return False
+
+                rule_id = cells[(stack_top - n_terminals) * width + term]
+                if rule_id < 0:
+                    return False
+                stack.extend(pushes[rule_id])
+
+        return True
+
+    def traced_feed(self, stack, terms):
+        table = self.table
+        cells = table.cells
+        pushes = table.pushes
+        n_terminals = table.n_terminals
+        width = table.width
+        hits = self.stats.hits(len(pushes))
+
+        matched = 0
+        expansions = 0
+        high_water = len(stack)
+        try:
+            for term in terms:
+                while True:
+                    stack_top = stack.pop()
+                    if stack_top < n_terminals:
+                        if stack_top == term:
+                            matched += 1
+                            break
+                        return False
+
+                    rule_id = cells[(stack_top - n_terminals) * width + term]
+                    if rule_id < 0:
+                        return False
+                    stack.extend(pushes[rule_id])
+                    hits[rule_id] += 1
+                    expansions += 1
+                    if len(stack) > high_water:
+                        high_water = len(stack)
+            return True
+        finally:
+            self.stats.count("matched", matched)
+            self.stats.count("expansions", expansions)
+            self.stats.high_water("max_stack", high_water)
+
+    def derive(self, input_text):
+        # like parse() but records the leftmost derivation, None when rejected
+        table = self.table
+        cells = table.cells
+        pushes = table.pushes
+        n_terminals = table.n_terminals
+        width = table.width
+
+        start = time.perf_counter()
+        productions = array("i")
+        offsets = array("i")
+        add_production = productions.append
+        add_offset = offsets.append
+        stack = self.reset([])
+        pop = stack.pop
+        extend = stack.extend
+        terms = chain(map(table.char_ids.__getitem__, input_text), (table.end,))
+        for offset, term in enumerate(terms):
+            while True:
+                stack_top = pop()
+                if stack_top < n_terminals:
+                    if stack_top == term:
+                        break
+                    return self.derived(start, None, productions)
+
+                rule_id = cells[(stack_top - n_terminals) * width + term]
+                if rule_id < 0:
+                    return self.derived(start, None, productions)
+                extend(pushes[rule_id])
+                add_production(rule_id)
+                add_offset(offset)
+
+        derivation = Derivation(table, productions, offsets, len(input_text))
+        return self.derived(start, derivation, productions)
+
+    def derived(self, start, derivation, productions):
+        # counts a derive() input, its expansions and the productions it used
+        if self.stats is not None:
+            hits = self.stats.hits(len(self.table.pushes))
+            for rule_id in productions:
+                hits[rule_id] += 1
+            self.stats.count("expansions", len(productions))
+            self.account(start, derivation is not None)
+        return derivation
+
+    def check(self, input_text, max_errors=None):
+        # like parse() but recovers from errors and reports them, stops after
+        # max_errors errors when it is given and when self.limits are hit
+        table = self.table
+        cells = table.cells
+        pushes = table.pushes
+        n_terminals = table.n_terminals
+        width = table.width
+        end = table.end
+        limits = self.limits or NO_LIMITS
+        max_stack, per_char, clock, deadline, max_recoveries = limits.bounds()
+
+        terms = map(table.char_ids.__getitem__, input_text)
+        stack = self.reset([])
+        errors = []
+        # position of the last reset to the start symbol, at most one per
+        # character or a character only the start symbol's rules can be
+        # followed by would be reset for forever
+        reset_at = 0
+        steps = 0
+        for count, term in enumerate(chain(terms, (end,)), 1):
+            if steps + count >= clock:
+                clock += CLOCK_STEPS
+                if time.monotonic() > deadline:
+                    return self.check_result(False, errors, Limit.TIME)
+            while True:
+                stack_top = stack.pop()
+                if stack_top < n_terminals:
+                    if stack_top == term:
                         break
-                    print(
-                        f"Expected '{stack_top.value}' but got '{char}' in character number {count}"
+                    if stack_top == end:
+                        # a second reset for the same character skips it
+                        self.reset(stack)
+                        action = Recovery.RESET if reset_at != count else Recovery.SKIP
+                        reset_at = count
+                    else:
+                        action = Recovery.POP
+                    errors.append(
+                        ErrorRecord(
+                            count,
+                            input_text[count - 1 : count] or "$",
+                            (table.terminals[stack_top],),
+                            action,
+                        )
                     )
-                    if input_end == stack_top:
-                        stack = [Lexeme("$", LexemeTypes.TERMINAL), first_rule]
-                    result = False
+                    if len(errors) > max_recoveries:
+                        return self.check_result(False, errors, Limit.RECOVERIES)
+                    if len(errors) == max_errors:
+                        return self.check_result(False, errors)
+                    if action == Recovery.SKIP:
+                        break
+                    continue
+
+                rule_id = cells[(stack_top - n_terminals) * width + term]
+                if rule_id >= 0:
+                    stack.extend(pushes[rule_id])
+                    steps += 1
+                    if len(stack) > max_stack:
+                        return self.check_result(False, errors, Limit.STACK)
+                    if steps > per_char * count:
+                        return self.check_result(False, errors, Limit.STEPS)
                     continue
 
-                rule_id = self.rule_table[stack_top].get(char)
-                if not rule_id:
+                if rule_id == table.SYNCH and len(stack) != 1:
+                    action = Recovery.SYNCH
+                else:
                     stack.append(stack_top)
-                    print(
-                        f"SyntaxError: can not parse '{char}' in character number {count}, skipping it"
+                    action = Recovery.SKIP
+                errors.append(
+                    ErrorRecord(
+                        count,
+                        input_text[count - 1 : count] or "$",
+                        table.expected(stack_top),
+                        action,
                     )
-                    result = False
+                )
+                if len(errors) > max_recoveries:
+                    return self.check_result(False, errors, Limit.RECOVERIES)
+                if len(errors) == max_errors:
+                    return self.check_result(False, errors)
+                if action == Recovery.SKIP:
                     break
-                rule_id = rule_id[0]
-                if rule_id == synch:
-                    print(
-                        f"SyntaxError: can not parse '{char}' in character number {count}, trying new rule"
-                    )
-                    result = False
 
-                    if len(stack) == 1:
-                        stack.append(stack_top)
-                        break
-                    continue
-
-                rule_copy = list(symbol_table["rules"][rule_id][1])
-                rule_copy.reverse()
-                stack.extend(rule_copy)
-
-        return result and not stack
+        return self.check_result(not errors and not stack, errors)
+
+    def check_result(self, accepted, errors, limit=None):
+        if self.stats is not None:
+            self.stats.count("checked")
+            for error in errors:
+                self.stats.count(f"recoveries_{error.action.value}")
+            if limit is not None:
+                self.stats.count(f"limits_{limit.value}")
+        return ParseResult(accepted, errors, limit)
+
+
+@contextlib.contextmanager
+def map_file(f):
+    # read only mapping of an open binary file, empty files can not be mapped
+    if os.fstat(f.fileno()).st_size == 0:
+        yield b""
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield data
+
+
+def decode_chunks(chunks):
+    # str chunks from a mix of str and utf-8 bytes ones
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = decoder.decode(chunk)
+        yield chunk
+    yield decoder.decode(b"", True)
+
+
+def read_chunks(source, chunk_size):
+    if not hasattr(source, "read"):
+        yield from source
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+worker_machine = None
+
+
+def init_worker(table, limits=None, traced=False):
+    global worker_machine
+    stats = Stats() if traced else None
+    worker_machine = LL1Machine(table=table, stats=stats, limits=limits)
+
+
+def validate_range(path, start, stop):
+    # the verdicts as bytes and, when the worker is traced, the Stats of the
+    # range alone
+    if worker_machine.stats is not None:
+        worker_machine.stats = Stats()
+    if worker_machine.table.byte_ids() is not None:
+        with open(path, "rb") as f, map_file(f) as data:
+            verdicts = worker_machine.parse_byte_lines(data, start, stop)
+            return bytes(map(bool, verdicts)), worker_machine.stats
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    lines = data.decode().split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return bytes(map(bool, worker_machine.parse_lines(lines))), worker_machine.stats
+
+
+def split_file(path, shards):
+    # byte ranges of roughly equal size, each one starting at a line start
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, shards):
+            f.seek(max(size * i // shards, bounds[-1]))
+            if f.tell() != 0:
+                f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def validate_file_parallel(
+    table, path, workers=None, shards_per_worker=4, limits=None, stats=None
+):
+    # the workers' counters and machine times are merged into stats
+    workers = workers or os.cpu_count() or 1
+    ranges = split_file(path, workers * shards_per_worker)
+    with ProcessPoolExecutor(
+        workers,
+        initializer=init_worker,
+        initargs=(table, limits, stats is not None),
+    ) as pool:
+        starts, stops = zip(*ranges) if ranges else ((), ())
+        for verdicts, range_stats in pool.map(
+            validate_range, [path] * len(ranges), starts, stops
+        ):
+            if stats is not None:
+                stats.merge(range_stats)
+            for verdict in verdicts:
+                yield bool(verdict)
 
 
 class SyntaxAnalyzer(SyntaxAnalyzerBase):
-    def __init__(self, lexical_analyzer=None, look_ahead=None):
+    def __init__(
+        self, lexical_analyzer=None, look_ahead=None, compact=False, stats=None
+    ):
         super().__init__(lexical_analyzer, look_ahead)
-        self.stack = []
+        self.stats = stats
+        if stats is not None and self.analyzer.stats is None:
+            self.analyzer.stats = stats
+        self.rules = []
+        # rules left out by prune(), in their original order
+        self.pruned = []
+        self.nullables = set()
+        self.conflicts = set()
+        self.rule_table = {}
+        # with compact the Lexeme set view is only built by expand_analyze_table
+        self.compact = compact
+        self.bit_table = {"firsts": {}, "follows": {}, "right_firsts": {}}
         self.analyze_table = {"firsts": {}, "follows": {}, "right_firsts": {}}
 
-    def get_first_of_non_terminal(self, left, rights, rule_id):
-        self.analyze_table["firsts"].setdefault(left, set())
-        self.analyze_table["right_firsts"].setdefault(rule_id, set())
-
-        if left in self.stack:
-            raise InvalidSemantic(
-                f"Grammar have left recursion in <{left.value}> non terminal"
-            )
+    def index_rules(self):
+        # non-terminal -> its rule ids, and -> (rule id, position) of every use
+        self.productions = {}
+        self.occurrences = {}
+        for rule_id, (left, rights) in enumerate(self.rules):
+            self.productions.setdefault(left, []).append(rule_id)
+            for position, symbol in enumerate(rights):
+                if symbol.type == LexemeTypes.NON_TERMINAL:
+                    self.occurrences.setdefault(symbol, []).append((rule_id, position))
 
-        for symbol in rights:
-            if symbol.type == LexemeTypes.TERMINAL and symbol != epsilon:
-                self.analyze_table["right_firsts"][rule_id].add(symbol)
-                self.analyze_table["firsts"][left].add(symbol)
-                return
+        for symbol in self.occurrences:
+            if symbol not in self.productions:
+                raise InvalidSemantic(f"<{symbol.value}> non terminal is not defined")
 
+    def index_rule(self, rule_id, left, rights):
+        self.productions.setdefault(left, []).append(rule_id)
+        for position, symbol in enumerate(rights):
             if symbol.type == LexemeTypes.NON_TERMINAL:
-                self.stack.append(left)
-                self.get_firsts(symbol)
-                self.stack.pop()
-                symbol_firsts = self.analyze_table["firsts"][symbol]
-
-                self.analyze_table["firsts"][left].update(symbol_firsts)
-                self.analyze_table["right_firsts"][rule_id].update(symbol_firsts)
+                self.occurrences.setdefault(symbol, []).append((rule_id, position))
+
+    def get_nullables(self):
+        rules = self.rules
+        # per rule, the number of symbols not yet known to derive epsilon
+        pending = []
+        queue = deque()
+        for left, rights in rules:
+            count = 0
+            for symbol in rights:
+                if symbol.type == LexemeTypes.NON_TERMINAL:
+                    count += 1
+                elif symbol != epsilon:
+                    count = -1
+                    break
+            pending.append(count)
+            if count == 0:
+                queue.append(left)
+
+        self.nullables = set()
+        while queue:
+            symbol = queue.popleft()
+            if symbol in self.nullables:
+                continue
+            self.nullables.add(symbol)
+            for rule_id, _ in self.occurrences.get(symbol, ()):
+                if pending[rule_id] > 0:
+                    pending[rule_id] -= 1
+                    if pending[rule_id] == 0:
+                        queue.append(rules[rule_id][0])
+
+    def rule_nullable(self, rule_id):
+        return all(
+            symbol in self.nullables
+            if symbol.type == LexemeTypes.NON_TERMINAL
+            else symbol == epsilon
+            for symbol in self.rules[rule_id][1]
+        )
 
-                if epsilon in symbol_firsts:
-                    self.analyze_table["firsts"][left].remove(epsilon)
-                    self.analyze_table["right_firsts"][rule_id].remove(epsilon)
+    def update_nullables(self, seeds):
+        # after the rules of seeds changed: the nullables that may only have
+        # derived epsilon through them are dropped and the ones that still do
+        # are found again; returns the symbols that changed
+        rules = self.rules
+        nullables = self.nullables
+        dropped = set()
+        stack = [symbol for symbol in seeds if symbol in nullables]
+        while stack:
+            symbol = stack.pop()
+            if symbol in dropped:
+                continue
+            dropped.add(symbol)
+            for rule_id, _ in self.occurrences.get(symbol, ()):
+                left = rules[rule_id][0]
+                if left in nullables and left not in dropped:
+                    stack.append(left)
+        nullables -= dropped
+
+        found = set()
+        stack = [s for s in chain(dropped, seeds) if s in self.productions]
+        while stack:
+            symbol = stack.pop()
+            if symbol in nullables or not any(
+                map(self.rule_nullable, self.productions[symbol])
+            ):
+                continue
+            nullables.add(symbol)
+            found.add(symbol)
+            stack.extend(rules[i][0] for i, _ in self.occurrences.get(symbol, ()))
+        return dropped ^ found
+
+    def edge_symbols(self, symbols):
+        # the non-terminals of symbols up to the first one deriving a terminal
+        edges = []
+        for symbol in symbols:
+            if symbol.type == LexemeTypes.NON_TERMINAL:
+                edges.append(symbol)
+                if symbol in self.nullables:
                     continue
-                else:
-                    return
-
-        self.analyze_table["firsts"][left].add(epsilon)
-        self.analyze_table["right_firsts"][rule_id].add(epsilon)
-
-    def get_firsts(self, search_symbol=None):
-        for rule_id, (left, rights) in enumerate(symbol_table["rules"]):
-            if not search_symbol or (search_symbol and left == search_symbol):
-                self.get_first_of_non_terminal(left, rights, rule_id)
-
-    def get_follow_of_non_terminal(self, left, rights, search_symbol):
-        self.analyze_table["follows"].setdefault(search_symbol, set())
-        if search_symbol in self.stack:
-            stack_top = self.stack[-1]
-            self.analyze_table["follows"][search_symbol].update(
-                self.analyze_table["follows"][stack_top]
-            )
-            self.analyze_table["follows"][stack_top].update(
-                self.analyze_table["follows"][search_symbol]
+            elif symbol == epsilon:
+                continue
+            break
+        return edges
+
+    def link(self, lefts):
+        # (re)builds the edges of lefts: corners[left] are the non-terminals
+        # its first terminal can come from, corner_users the reverse of them,
+        # and follow_users[left] the symbols whose FOLLOW includes FOLLOW(left)
+        for left in lefts:
+            for symbol in self.corners.pop(left, ()):
+                users = self.corner_users[symbol]
+                users[left] -= 1
+                if not users[left]:
+                    del users[left]
+            if left not in self.productions:
+                self.follow_users.pop(left, None)
+                continue
+            corners = []
+            follow_users = []
+            for rule_id in self.productions[left]:
+                rights = self.rules[rule_id][1]
+                corners += self.edge_symbols(rights)
+                follow_users += self.edge_symbols(reversed(rights))
+            self.corners[left] = corners
+            self.follow_users[left] = follow_users
+            for symbol in corners:
+                users = self.corner_users.setdefault(symbol, {})
+                users[left] = users.get(left, 0) + 1
+
+    def check_left_recursion(self, lefts=None):
+        # a cycle between left corners is a left recursion; without lefts the
+        # edges of every non-terminal are built first, otherwise only cycles
+        # through lefts are looked for. Returns lefts in an order FIRST sets
+        # can be computed in
+        full = lefts is None
+        if full:
+            self.corners = {}
+            self.corner_users = {}
+            self.follow_users = {}
+            self.link(self.productions)
+            lefts = self.productions
+        corners = self.corners
+
+        # components come out after the ones they use, so when there is no
+        # cycle this is the order FIRST sets can be computed in
+        components = strongly_connected(lefts, corners)
+        cycles = []
+        for component in components:
+            if len(component) > 1 or component[0] in corners[component[0]]:
+                start = min(component, key=self.position)
+                cycles.append(find_cycle(start, component, corners))
+        if cycles:
+            cycles.sort(key=lambda cycle: self.position(cycle[0]))
+            raise LeftRecursion(cycles)
+        order = [component[0] for component in components]
+        if full and self.stats is not None:
+            self.stats.high_water("left_corner_depth", self.corner_depth(order))
+        return order
+
+    def corner_depth(self, order):
+        # non-terminals on the longest chain of left corners, which is how
+        # deep a left derivation can nest before its first terminal
+        depths = {}
+        for left in order:
+            depths[left] = 1 + max(
+                (depths.get(symbol, 0) for symbol in self.corners[left]), default=0
             )
-            return
-
-        try:
-            left_index = rights.index(search_symbol)
-            for symbol in rights[left_index + 1 :]:
-                if symbol.type == LexemeTypes.TERMINAL and symbol != epsilon:
-                    self.analyze_table["follows"][search_symbol].add(symbol)
-                    return
+        return max(depths.values(), default=0)
+
+    def position(self, left):
+        return self.productions[left][0]
+
+    def number_terminals(self, rules=None):
+        # FIRST and FOLLOW sets are int bitmasks over these terminals, bit 0 is
+        # epsilon and bit 1 is the input end; with rules only their new
+        # terminals are numbered, so existing bits stay valid
+        if rules is None:
+            rules = self.rules
+            self.terminals = [epsilon, input_end]
+            self.terminal_bits = {epsilon: 1, input_end: 2}
+        for _, rights in rules:
+            for symbol in rights:
+                if (
+                    symbol.type == LexemeTypes.TERMINAL
+                    and symbol not in self.terminal_bits
+                ):
+                    self.terminal_bits[symbol] = 1 << len(self.terminals)
+                    self.terminals.append(symbol)
+
+    def expand(self, mask):
+        symbols = set()
+        while mask:
+            low = mask & -mask
+            symbols.add(self.terminals[low.bit_length() - 1])
+            mask ^= low
+        return symbols
+
+    def expand_analyze_table(self):
+        self.analyze_table = {
+            name: {k: self.expand(v) for k, v in masks.items()}
+            for name, masks in self.bit_table.items()
+        }
+
+    def prepare(self):
+        # returns the order FIRST sets are computed in
+        self.index_rules()
+        self.get_nullables()
+        order = self.check_left_recursion()
+        self.number_terminals()
+        return order
+
+    def get_firsts(self):
+        # every non-terminal comes after the ones its FIRST uses in the order,
+        # so each rule is evaluated once
+        order = self.prepare()
+        self.bit_table["firsts"] = {}
+        self.bit_table["right_firsts"] = {}
+        for left in order:
+            self.update_first(left)
+
+    def update_first(self, left):
+        # FIRST of left and of its bodies from the FIRST sets they use; returns
+        # whether FIRST(left) changed and whether the one of a body did
+        rules = self.rules
+        terminal_bits = self.terminal_bits
+        firsts = self.bit_table["firsts"]
+        right_firsts = self.bit_table["right_firsts"]
+        first = 0
+        bodies_changed = False
+        for rule_id in self.productions[left]:
+            mask = 0
+            nullable = True
+            for symbol in rules[rule_id][1]:
                 if symbol.type == LexemeTypes.NON_TERMINAL:
-                    firsts = self.analyze_table["firsts"][symbol]
-                    self.analyze_table["follows"][search_symbol].update(firsts)
-                    if epsilon in firsts:
-                        self.analyze_table["follows"][search_symbol].remove(epsilon)
+                    mask |= firsts[symbol]
+                    if symbol in self.nullables:
                         continue
-                    else:
-                        return
+                elif symbol == epsilon:
+                    continue
+                else:
+                    mask |= terminal_bits[symbol]
+                nullable = False
+                break
+            mask = mask | 1 if nullable else mask & ~1
+            if right_firsts.get(rule_id) != mask:
+                right_firsts[rule_id] = mask
+                bodies_changed = True
+            first |= mask
+        changed = firsts.get(left) != first
+        firsts[left] = first
+        return changed, bodies_changed
+
+    def get_follows(self, symbols=None):
+        # without symbols everything is computed, otherwise only the FOLLOW
+        # sets of symbols, which must include every non-terminal whose FOLLOW
+        # uses them
+        rules = self.rules
+        if symbols is None:
+            symbols = self.productions
+            rule_ids = range(len(rules))
+            self.bit_table["follows"] = {}
+        else:
+            rule_ids = sorted(
+                {rule_id for s in symbols for rule_id, _ in self.occurrences.get(s, ())}
+            )
+        terminal_bits = self.terminal_bits
+        firsts = self.bit_table["firsts"]
+        follows = self.bit_table["follows"]
+        for symbol in symbols:
+            follows[symbol] = 0
+        if rules[0][0] in symbols:
+            follows[rules[0][0]] = terminal_bits[input_end]
+
+        # symbol -> lefts of the rules it can end, FOLLOW(left) flows into it
+        inherits = {symbol: [] for symbol in symbols}
+        for rule_id in rule_ids:
+            left, rights = rules[rule_id]
+            trailer = 0
+            at_end = True
+            for symbol in reversed(rights):
+                if symbol.type == LexemeTypes.NON_TERMINAL:
+                    if symbol in symbols:
+                        follows[symbol] |= trailer
+                        if at_end and symbol is not left:
+                            inherits[symbol].append(left)
+                    if symbol not in self.nullables:
+                        trailer = 0
+                        at_end = False
+                    trailer |= firsts[symbol] & ~1
+                elif symbol != epsilon:
+                    trailer = terminal_bits[symbol]
+                    at_end = False
+
+        # the members of a component share one FOLLOW set, and the components
+        # they inherit from are already final, as are non-terminals outside
+        # symbols
+        components = strongly_connected(symbols, inherits)
+        for component in components:
+            if len(component) == 1:
+                symbol = component[0]
+                mask = follows[symbol]
+                for left in inherits[symbol]:
+                    mask |= follows[left]
+                follows[symbol] = mask
+                continue
+            mask = 0
+            for symbol in component:
+                mask |= follows[symbol]
+                for left in inherits[symbol]:
+                    mask |= follows[left]
+            for symbol in component:
+                follows[symbol] = mask
+        if self.stats is not None:
+            self.stats.count("follow_iterations", len(components))
+
+    def edit(self, removed=(), added=()):
+        # removes the rules with the given ids and appends the added (left,
+        # rights) rules, the ids after the first removed rule shift down. Only
+        # what depends on the changed non-terminals is re-analysed and only
+        # their rows are replaced; returns the LL1 conflicts it created and
+        # resolved
+        removed = sorted(set(removed))
+        added = list(added)
+        if (
+            not added
+            and len(removed) >= len(self.rules)
+            and set(range(len(self.rules))).issubset(removed)
+        ):
+            raise InvalidSemantic("Grammar has no rules left")
+        old_rules = self.rules
+        old_count = len(old_rules)
+        old_pruned = self.pruned
+        old_conflicts = self.conflicts
+        pruned = {left for left, _ in old_pruned}
+        # rule 0 may leave the start symbol's rules or pruned rules may be
+        # useful again
+        full = 0 in removed or any(
+            left in pruned or not pruned.isdisjoint(rights) for left, rights in added
+        )
+        if not full:
+            self.check_defined(removed, added)
+        try:
+            if full:
+                gone = set(removed)
+                rules = [rule for i, rule in enumerate(old_rules) if i not in gone]
+                # the start symbol only changes when it has no rules left
+                self.rules = self.start_first(
+                    rules + added + old_pruned, old_rules[0][0]
+                )
+                self.analyze()
+            else:
+                dropped = [old_rules[i] for i in removed]
+                new_lefts = {left for left, _ in added if left not in self.productions}
+                self.edit_rules(removed, added)
+                if self.made_useless(dropped, new_lefts):
+                    self.rules += old_pruned
+                    self.analyze()
+                else:
+                    edited = dropped + added
+                    self.reanalyze({left for left, _ in edited}, edited)
+        except Exception:
+            # back to the analysis before the edit, its useless rules were
+            # already reported; added rules may have been appended to old_rules
+            self.rules = old_rules[:old_count] + old_pruned
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UselessSymbolWarning)
+                self.analyze()
+            raise
+        return self.conflict_changes(old_conflicts)
+
+    def check_defined(self, removed, added):
+        # raises what index_rules would for the edited rules, before anything
+        # is changed
+        counts = {}
+        for rule_id in removed:
+            left = self.rules[rule_id][0]
+            counts[left] = counts.get(left, 0) + 1
+        defined = {left for left, _ in added}
+        undefined = {
+            left
+            for left, count in counts.items()
+            if count == len(self.productions[left]) and left not in defined
+        }
+        gone = set(removed)
+        for symbol in undefined:
+            if any(i not in gone for i, _ in self.occurrences.get(symbol, ())):
+                raise InvalidSemantic(f"<{symbol.value}> non terminal is not defined")
+        for _, rights in added:
+            for symbol in rights:
+                if (
+                    symbol.type == LexemeTypes.NON_TERMINAL
+                    and symbol not in defined
+                    and (symbol not in self.productions or symbol in undefined)
+                ):
+                    raise InvalidSemantic(
+                        f"<{symbol.value}> non terminal is not defined"
+                    )
 
-            self.stack.append(search_symbol)
-            self.get_follows(left)
-            self.stack.pop()
-            self.analyze_table["follows"][search_symbol].update(
-                self.analyze_table["follows"][left]
+    def edit_rules(self, removed, added):
+        # edits self.rules, the rule index and every table keyed by rule id
+        rules = self.rules
+        if removed:
+            # only the rules after the first removed one are renumbered
+            first = removed[0]
+            gone = set(removed)
+            renumber = {}
+            kept = rules[:first]
+            lefts = set()
+            symbols = set()
+            for rule_id in range(first, len(rules)):
+                left, rights = rule = rules[rule_id]
+                lefts.add(left)
+                symbols.update(rights)
+                if rule_id not in gone:
+                    renumber[rule_id] = len(kept)
+                    kept.append(rule)
+
+            for left in lefts:
+                ids = [
+                    renumber.get(i, i) for i in self.productions[left] if i not in gone
+                ]
+                if ids:
+                    self.productions[left] = ids
+                else:
+                    del self.productions[left]
+            for symbol in symbols & self.occurrences.keys():
+                uses = [
+                    (renumber.get(i, i), position)
+                    for i, position in self.occurrences[symbol]
+                    if i not in gone
+                ]
+                if uses:
+                    self.occurrences[symbol] = uses
+                else:
+                    del self.occurrences[symbol]
+            for masks in (
+                self.bit_table["right_firsts"],
+                self.analyze_table["right_firsts"],
+            ):
+                # a rule only moves down, to an id already visited
+                for rule_id in range(first, len(rules)):
+                    mask = masks.pop(rule_id, None)
+                    if mask is not None and rule_id in renumber:
+                        masks[renumber[rule_id]] = mask
+            edited = {rules[i][0] for i in removed}
+            for left in lefts - edited:
+                self.rule_table[left] = {
+                    terminal: ids
+                    if ids[0] is synch
+                    else [renumber.get(i, i) for i in ids]
+                    for terminal, ids in self.rule_table[left].items()
+                }
+            self.rules = rules = kept
+
+        for left, rights in added:
+            rules.append((left, rights))
+            self.index_rule(len(rules) - 1, left, rights)
+        self.number_terminals(added)
+
+    def made_useless(self, dropped, new_lefts):
+        # whether the edit that removed the dropped rules and added the rules
+        # of new_lefts left some rule useless; every rule was useful before it,
+        # so only the non-terminals that used a changed one can have stopped
+        # deriving a terminal string and only the ones under a changed one can
+        # have become unreachable
+        rules = self.rules
+        productions = self.productions
+        unproductive = set()
+        stack = [left for left, _ in dropped if left in productions]
+        stack += new_lefts
+        while stack:
+            symbol = stack.pop()
+            if symbol not in unproductive:
+                unproductive.add(symbol)
+                stack.extend(rules[i][0] for i, _ in self.occurrences.get(symbol, ()))
+        stack = list(unproductive)
+        while stack:
+            symbol = stack.pop()
+            if symbol not in unproductive or not any(
+                unproductive.isdisjoint(rules[i][1]) for i in productions[symbol]
+            ):
+                continue
+            unproductive.discard(symbol)
+            stack.extend(rules[i][0] for i, _ in self.occurrences.get(symbol, ()))
+        start = rules[0][0]
+        if start in unproductive:
+            raise InvalidSemantic(
+                f"<{start.value}> start symbol does not derive any terminal string"
+            )
+        if unproductive:
+            return True
+
+        unreachable = set()
+        stack = list(new_lefts)
+        for _, rights in dropped:
+            stack.extend(
+                symbol
+                for symbol in rights
+                if symbol.type == LexemeTypes.NON_TERMINAL and symbol in productions
+            )
+        while stack:
+            symbol = stack.pop()
+            if symbol not in unreachable:
+                unreachable.add(symbol)
+                for rule_id in productions[symbol]:
+                    stack.extend(
+                        s
+                        for s in rules[rule_id][1]
+                        if s.type == LexemeTypes.NON_TERMINAL
+                    )
+        stack = [
+            symbol
+            for symbol in unreachable
+            if symbol is start
+            or any(
+                rules[i][0] not in unreachable
+                for i, _ in self.occurrences.get(symbol, ())
+            )
+        ]
+        while stack:
+            symbol = stack.pop()
+            if symbol not in unreachable:
+                continue
+            unreachable.discard(symbol)
+            for rule_id in productions[symbol]:
+                stack.extend(
+                    s for s in rules[rule_id][1] if s.type == LexemeTypes.NON_TERMINAL
+                )
+        return bool(unreachable)
+
+    def reanalyze(self, lefts, edited):
+        # brings the analysis up to date after the rules of lefts, edited is
+        # every removed and added rule, changed
+        rules = self.rules
+        productions = self.productions
+        firsts = self.bit_table["firsts"]
+        follows = self.bit_table["follows"]
+        undefined = {left for left in lefts if left not in productions}
+        lefts -= undefined
+
+        nullable_changed = self.update_nullables(lefts | undefined)
+        nullable_changed -= undefined
+        relinked = set(lefts)
+        for symbol in nullable_changed:
+            relinked.update(rules[i][0] for i, _ in self.occurrences.get(symbol, ()))
+        self.link(relinked | undefined)
+
+        # FIRST of the non-terminals that can start with a changed one, each is
+        # only evaluated again when it or one of its corners changed
+        first_seeds = relinked | nullable_changed
+        first_dirty = self.dependents(first_seeds, self.corner_users)
+        first_changed = set()
+        bodies_changed = set()
+        for left in self.check_left_recursion(first_dirty):
+            if left in first_seeds or not first_changed.isdisjoint(self.corners[left]):
+                first, bodies = self.update_first(left)
+                if first:
+                    first_changed.add(left)
+                if bodies:
+                    bodies_changed.add(left)
+
+        follow_seeds = {left for left in lefts if left not in follows}
+        for _, rights in edited:
+            follow_seeds.update(
+                symbol
+                for symbol in rights
+                if symbol.type == LexemeTypes.NON_TERMINAL and symbol in productions
             )
+        for symbol in first_changed | nullable_changed:
+            for rule_id, position in self.occurrences.get(symbol, ()):
+                follow_seeds.update(
+                    s
+                    for s in rules[rule_id][1][:position]
+                    if s.type == LexemeTypes.NON_TERMINAL
+                )
+        follow_dirty = self.dependents(follow_seeds, self.follow_users)
+        old_follows = {symbol: follows.get(symbol) for symbol in follow_dirty}
+        self.get_follows(follow_dirty)
+        follow_changed = {
+            symbol for symbol in follow_dirty if follows[symbol] != old_follows[symbol]
+        }
+        rows = lefts | bodies_changed | follow_changed
+
+        self.conflicts = {
+            c for c in self.conflicts if c[0] not in rows and c[0] in productions
+        }
+        for left in undefined:
+            for table in (firsts, follows, self.rule_table):
+                table.pop(left, None)
+        for left in rows:
+            self.rule_table[left] = self.rule_row(left)
+        self.valid_ll1 = not self.conflicts
+        if self.stats is not None:
+            self.stats.count("edited_rows", len(rows))
+
+        if not self.compact:
+            analyze_table = self.analyze_table
+            for left in undefined:
+                analyze_table["firsts"].pop(left, None)
+                analyze_table["follows"].pop(left, None)
+            for left in first_changed:
+                analyze_table["firsts"][left] = self.expand(firsts[left])
+            for symbol in follow_changed:
+                analyze_table["follows"][symbol] = self.expand(follows[symbol])
+            right_firsts = self.bit_table["right_firsts"]
+            for left in bodies_changed:
+                for rule_id in productions[left]:
+                    analyze_table["right_firsts"][rule_id] = self.expand(
+                        right_firsts[rule_id]
+                    )
 
-        except ValueError:
-            pass
+    def add_production(self, left, rights):
+        return self.edit(added=[(left, list(rights))])
 
-    def get_follows(self, search_symbol=None):
-        for left, rights in symbol_table["rules"]:
-            try:
-                self.get_follow_of_non_terminal(left, rights, search_symbol)
-            except InvalidSemantic:
-                return
+    def remove_production(self, rule_id):
+        return self.edit(removed=[rule_id])
+
+    def replace_productions(self, left, bodies):
+        return self.edit(
+            removed=self.productions.get(left, ()),
+            added=[(left, list(rights)) for rights in bodies],
+        )
+
+    def conflict_changes(self, old_conflicts):
+        return {
+            "created": self.conflicts - old_conflicts,
+            "resolved": old_conflicts - self.conflicts,
+        }
+
+    @staticmethod
+    def dependents(seeds, edges):
+        found = set(seeds)
+        stack = list(seeds)
+        while stack:
+            for symbol in edges.get(stack.pop(), ()):
+                if symbol not in found:
+                    found.add(symbol)
+                    stack.append(symbol)
+        return found
 
     def parse_non_terminal(self):
-        symbol_table.setdefault("rules", [])
         left_value = self.look_ahead
         self.match(LexemeTypes.ASSIGN)
         right_value = []
@@ -398,86 +1923,107 @@ class SyntaxAnalyzer(SyntaxAnalyzerBase):
             if self.look_ahead.type == LexemeTypes.INSTRUCTION_END:
                 break
             if self.look_ahead.type == LexemeTypes.OR:
-                symbol_table["rules"].append((left_value, right_value))
+                self.rules.append((left_value, right_value))
                 right_value = []
                 continue
             right_value.append(self.look_ahead)
 
-        symbol_table["rules"].append((left_value, right_value))
+        self.rules.append((left_value, right_value))
+
+    def rule_row(self, left):
+        follows = self.bit_table["follows"]
+        row = {}
+        # terminals that already have a rule, a shared bit is a conflict
+        taken = 0
+        for idx in self.productions[left]:
+            mask = self.bit_table["right_firsts"][idx]
+            if mask & 1:
+                mask = (mask & ~1) | follows[left]
+            self.conflicts.update((left, t) for t in self.expand(mask & taken))
+            taken |= mask
+            for terminal in self.expand(mask):
+                row.setdefault(terminal, []).append(idx)
+
+        for follow in self.expand(follows[left] & ~taken):
+            row[follow] = [synch]
+        return row
 
     def create_rule_table(self):
-        self.rule_table = {k: {} for k, _ in symbol_table["rules"]}
-        self.valid_ll1 = True
-        for idx, (left, _) in enumerate(symbol_table["rules"]):
-            for first in self.analyze_table["right_firsts"].get(idx, []):
-                if first != epsilon:
-                    self.rule_table[left].setdefault(first, [])
-                    if len(self.rule_table[left][first]) != 0:
-                        self.valid_ll1 = False
-                    self.rule_table[left][first].append(idx)
-                else:
-                    for follow in self.analyze_table["follows"][left]:
-                        self.rule_table[left].setdefault(follow, [])
-                        if len(self.rule_table[left][follow]) != 0:
-                            self.valid_ll1 = False
-                        self.rule_table[left][follow].append(idx)
-
-        for idx, (left, _) in enumerate(symbol_table["rules"]):
-            for follow in self.analyze_table["follows"].get(left, []):
-                if not self.rule_table[left].get(follow, []):
-                    self.rule_table[left].setdefault(follow, [])
-                    self.rule_table[left][follow].append(synch)
-
-    def print_analyzes(self):
-        non_terminal = []
-        for k, _ in symbol_table["rules"]:
-            if k not in non_terminal:
-                non_terminal.append(k)
-        print()
-        print(
-            tabulate(
-                [
-                    [
-                        left,
-                        self.analyze_table["firsts"].get(left, ""),
-                        self.analyze_table["follows"].get(left, ""),
-                    ]
-                    for left in non_terminal
-                ],
-                headers=["Non-Terminal", "First", "Follow"],
-                tablefmt="simple_grid",
-                stralign="center",
-                numalign="center",
-            )
-        )
-        terminals = set()
-        for _, rights in symbol_table["rules"]:
-            for right_symbol in rights:
-                if (
-                    right_symbol.type == LexemeTypes.TERMINAL
-                    and right_symbol != epsilon
-                ):
-                    terminals.add(right_symbol)
-        headers = list(terminals) + [input_end]
+        self.conflicts = set()
+        self.rule_table = {left: self.rule_row(left) for left in self.productions}
+        self.valid_ll1 = not self.conflicts
+
+    def analysis_rows(self):
+        for left in dict.fromkeys(left for left, _ in self.rules):
+            yield [
+                left,
+                self.expand(self.bit_table["firsts"].get(left, 0)),
+                self.expand(self.bit_table["follows"].get(left, 0)),
+            ]
+
+    def rule_table_rows(self, headers, render=str):
         headers_idx = {i: idx for idx, i in enumerate(headers)}
-        table = []
         for non_terminal, rights in self.rule_table.items():
             line = [""] * len(headers)
             for terminal, rule_ids in rights.items():
-                line[headers_idx[terminal]] = ", ".join([str(i) for i in rule_ids])
-            table.append([non_terminal] + line)
-
-        print(
-            tabulate(
-                table,
-                headers=["Non-Terminal"] + headers,
-                tablefmt="simple_grid",
-                stralign="center",
-                numalign="center",
-            )
-        )
+                line[headers_idx[terminal]] = ", ".join([render(i) for i in rule_ids])
+            yield [non_terminal] + line
+
+    def report(self, format="grid", page_size=None):
+        # rendered lazily, one chunk per page of each table
+        headers = self.terminals[2:] + [input_end]
+        render = str if format == "grid" else lambda i: str(report_value(i))
+        tables = [
+            ("analysis", ["Non-Terminal", "First", "Follow"], self.analysis_rows()),
+            (
+                "rule_table",
+                ["Non-Terminal"] + headers,
+                self.rule_table_rows(headers, render),
+            ),
+        ]
+        if format == "grid":
+            from tabulate import tabulate
+
+            for _, headers, rows in tables:
+                for page in pages(rows, page_size):
+                    yield tabulate(
+                        page,
+                        headers=headers,
+                        tablefmt="simple_grid",
+                        stralign="center",
+                        numalign="center",
+                    )
+        elif format == "csv":
+            for _, headers, rows in tables:
+                yield csv_lines([report_value(cell) for cell in headers])
+                for page in pages(rows, page_size):
+                    yield csv_lines(
+                        *[[report_value(cell) for cell in row] for row in page]
+                    )
+        elif format == "json":
+            for name, headers, rows in tables:
+                keys = [report_value(cell) for cell in headers]
+                for page in pages(rows, page_size):
+                    yield "\n".join(
+                        json.dumps(
+                            {"table": name}
+                            | dict(zip(keys, [report_value(cell) for cell in row]))
+                        )
+                        for row in page
+                    )
+        else:
+            raise ValueError(f"unknown report format {format!r}")
+
+    def print_analyzes(self):
+        print()
+        for chunk in self.report():
+            print(chunk)
 
     def parse(self):
+        run_phase(self.stats, "parse_rules", self.parse_rules)
+        self.analyze()
+
+    def parse_rules(self):
         while True:
             self.next()
             if self.look_ahead.type == LexemeTypes.END:
@@ -487,11 +2033,397 @@ class SyntaxAnalyzer(SyntaxAnalyzerBase):
             else:
                 InvalidSyntax(self).throw()
 
-        self.get_firsts()
-        self.stack = []
-        self.analyze_table["follows"] = {symbol_table["rules"][0][0]: {input_end}}
-        for left, _ in symbol_table["rules"]:
-            self.get_follows(left)
+    def useless(self):
+        # productive rules only use non-terminals that derive a terminal string,
+        # the useful ones are productive rules of reachable non-terminals
+        self.index_rules()
+        rules = self.rules
+        pending = []
+        queue = deque()
+        for left, rights in rules:
+            count = sum(1 for s in rights if s.type == LexemeTypes.NON_TERMINAL)
+            pending.append(count)
+            if count == 0:
+                queue.append(left)
+        productive = set()
+        while queue:
+            symbol = queue.popleft()
+            if symbol in productive:
+                continue
+            productive.add(symbol)
+            for rule_id, _ in self.occurrences.get(symbol, ()):
+                pending[rule_id] -= 1
+                if pending[rule_id] == 0:
+                    queue.append(rules[rule_id][0])
+
+        start = rules[0][0]
+        if start not in productive:
+            raise InvalidSemantic(
+                f"<{start.value}> start symbol does not derive any terminal string"
+            )
+        reachable = {start}
+        stack = [start]
+        while stack:
+            for rule_id in self.productions[stack.pop()]:
+                if pending[rule_id]:
+                    continue
+                for symbol in rules[rule_id][1]:
+                    if (
+                        symbol.type == LexemeTypes.NON_TERMINAL
+                        and symbol not in reachable
+                    ):
+                        reachable.add(symbol)
+                        stack.append(symbol)
+
+        useless = [
+            rule_id
+            for rule_id, (left, _) in enumerate(rules)
+            if pending[rule_id] or left not in reachable
+        ]
+        non_productive = [left for left in self.productions if left not in productive]
+        unreachable = [
+            left
+            for left in self.productions
+            if left in productive and left not in reachable
+        ]
+        return useless, non_productive, unreachable
+
+    def prune(self):
+        # leaves out the rules that are in no derivation of a terminal string
+        # from the start symbol, with a UselessSymbolWarning. The rules after a
+        # left out one are renumbered, so rule ids taken from self.rules before
+        # the prune may name other rules; when the first rule is left out the
+        # first kept rule of the start symbol takes its place
+        self.pruned = []
+        if not self.rules:
+            return
+        useless, non_productive, unreachable = self.useless()
+        if not useless:
+            return
+        useless = set(useless)
+        start = self.rules[0][0]
+        self.pruned = [rule for i, rule in enumerate(self.rules) if i in useless]
+        rules = [rule for i, rule in enumerate(self.rules) if i not in useless]
+        self.rules = self.start_first(rules, start)
+        if self.stats is not None:
+            self.stats.count("pruned_rules", len(self.pruned))
+        warnings.warn(UselessSymbolWarning(non_productive, unreachable, self.pruned))
+
+    @staticmethod
+    def start_first(rules, start):
+        # rules with the first one of start moved to the front, so the start
+        # symbol stays rules[0][0]
+        for rule_id, (left, _) in enumerate(rules):
+            if left == start:
+                if rule_id:
+                    rules.insert(0, rules.pop(rule_id))
+                break
+        return rules
+
+    def analyze(self):
+        self.prune()
+        run_phase(self.stats, "firsts", self.get_firsts)
+        run_phase(self.stats, "follows", self.get_follows)
+
+        run_phase(self.stats, "rule_table", self.create_rule_table)
+        if not self.compact:
+            run_phase(self.stats, "expand", self.expand_analyze_table)
+
+
+def strongly_connected(nodes, edges):
+    # Tarjan's algorithm without recursion, a component comes out after every
+    # component it has edges to; edges leaving nodes are ignored
+    index = {}
+    low = {}
+    stack = []
+    components = []
+    # index of members of finished components, so they never lower a low link
+    done = len(nodes)
+    for root in nodes:
+        if root in index:
+            continue
+        if not edges[root]:
+            index[root] = done
+            components.append([root])
+            continue
+        index[root] = low[root] = len(stack)
+        stack.append(root)
+        path = [(root, iter(edges[root]))]
+        while path:
+            node, children = path[-1]
+            for child in children:
+                child_index = index.get(child)
+                if child_index is None:
+                    if child not in nodes:
+                        continue
+                    index[child] = low[child] = len(stack)
+                    stack.append(child)
+                    path.append((child, iter(edges[child])))
+                    break
+                if child_index < low[node]:
+                    low[node] = child_index
+            else:
+                path.pop()
+                node_low = low[node]
+                if path and node_low < low[path[-1][0]]:
+                    low[path[-1][0]] = node_low
+                if node_low == index[node]:
+                    component = stack[node_low:]
+                    del stack[node_low:]
+                    for member in component:
+                        index[member] = done
+                    components.append(component)
+    return components
+
+
+def find_cycle(start, component, edges):
+    # shortest cycle through start inside a strongly connected component
+    members = set(component)
+    parents = {start: None}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for child in edges[node]:
+            if child == start:
+                cycle = [node]
+                while parents[cycle[-1]] is not None:
+                    cycle.append(parents[cycle[-1]])
+                return cycle[::-1]
+            if child in members and child not in parents:
+                parents[child] = node
+                queue.append(child)
+
+
+def pages(rows, page_size):
+    if not page_size:
+        yield list(rows)
+        return
+    rows = iter(rows)
+    while page := list(islice(rows, page_size)):
+        yield page
+
+
+def report_value(cell):
+    if isinstance(cell, Lexeme):
+        return cell.value
+    if isinstance(cell, set):
+        return sorted(symbol.value for symbol in cell)
+    return cell
+
+
+def csv_lines(*rows):
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    for row in rows:
+        writer.writerow(
+            [" ".join(cell) if isinstance(cell, list) else cell for cell in row]
+        )
+    return output.getvalue().rstrip("\n")
+
+
+class GrammarBuilder:
+    # rules made in code instead of the text format, a body is a list of
+    # symbols: "<name>" is a non-terminal, one character a terminal and the
+    # empty body is epsilon. The first left is the start symbol
+    def __init__(self) -> None:
+        self.rules = []
+
+    def add(self, left, *bodies):
+        if not isinstance(left, Lexeme):
+            if not isinstance(left, str):
+                raise ValueError(f"non-terminal {left!r} is not a string")
+            if left[:1] == "<" and left[-1:] == ">":
+                left = left[1:-1]
+            left = Lexeme(left, LexemeTypes.NON_TERMINAL)
+        for body in bodies:
+            if not isinstance(body, (list, tuple)):
+                raise ValueError(f"body {body!r} is not a list of symbols")
+            self.rules.append((left, [self.symbol(s) for s in body] or [epsilon]))
+        return self
+
+    @staticmethod
+    def symbol(symbol):
+        if isinstance(symbol, Lexeme):
+            return symbol
+        if not isinstance(symbol, str):
+            raise ValueError(f"symbol {symbol!r} is not a string")
+        if symbol == input_end.value:
+            raise ValueError(f"{symbol!r} is the input end, not a terminal")
+        if len(symbol) == 1:
+            return Lexeme(symbol, LexemeTypes.TERMINAL)
+        if len(symbol) >= 2 and symbol[0] == "<" and symbol[-1] == ">":
+            return Lexeme(symbol[1:-1], LexemeTypes.NON_TERMINAL)
+        raise ValueError(f"{symbol!r} is neither a character nor a <non-terminal>")
+
+    @classmethod
+    def from_dict(cls, data):
+        # {"E": [["<T>", "<E'>"]], "E'": [["+", "<T>", "<E'>"], []], ...}
+        if not isinstance(data, dict):
+            raise ValueError("rules must map non-terminals to lists of bodies")
+        builder = cls()
+        for left, bodies in data.items():
+            if not isinstance(bodies, list):
+                raise ValueError(f"bodies of {left!r} are not a list")
+            builder.add(left, *bodies)
+        return builder
+
+    @classmethod
+    def from_json(cls, json_text):
+        return cls.from_dict(json.loads(json_text))
+
+    def analyzer(self, compact=False, stats=None):
+        syntax_analyzer = SyntaxAnalyzer(compact=compact, stats=stats)
+        syntax_analyzer.rules = list(self.rules)
+        syntax_analyzer.analyze()
+        return syntax_analyzer
+
+
+class Grammar:
+    # owns the rules, analysis tables and compiled machine of one grammar, all
+    # read only after construction so one instance can be shared by threads
+    def __init__(self, syntax_analyzer):
+        self.analyzer = syntax_analyzer
+        # copies, the analyzer edits its tables in place
+        self.rules = list(syntax_analyzer.rules)
+        self.analyze_table = {
+            name: dict(table) for name, table in syntax_analyzer.analyze_table.items()
+        }
+        self.bit_table = {
+            name: dict(table) for name, table in syntax_analyzer.bit_table.items()
+        }
+        self.rule_table = dict(syntax_analyzer.rule_table)
+        # report() reads these copies, not the tables of later edits
+        self.reporter = copy.copy(syntax_analyzer)
+        self.reporter.rules = self.rules
+        self.reporter.bit_table = self.bit_table
+        self.reporter.rule_table = self.rule_table
+        self.reporter.terminals = list(syntax_analyzer.terminals)
+        self.valid_ll1 = syntax_analyzer.valid_ll1
+        self.stats = syntax_analyzer.stats
+        self.machine = LL1Machine(syntax_analyzer, stats=self.stats)
+        self.table = self.machine.table
+
+    @classmethod
+    def from_text(cls, grammar_text, compact=False, stats=None):
+        syntax_analyzer = SyntaxAnalyzer(
+            LexicalAnalyzer(InputFileManager(grammar_text)),
+            compact=compact,
+            stats=stats,
+        )
+        syntax_analyzer.parse()
+        return cls(syntax_analyzer)
+
+    @classmethod
+    def from_builder(cls, builder, compact=False, stats=None):
+        return cls(builder.analyzer(compact, stats))
+
+    @classmethod
+    def from_dict(cls, data, compact=False, stats=None):
+        return cls.from_builder(GrammarBuilder.from_dict(data), compact, stats)
 
-        self.create_rule_table()
-        self.print_analyzes()
+    @classmethod
+    def from_json(cls, json_text, compact=False, stats=None):
+        return cls.from_builder(GrammarBuilder.from_json(json_text), compact, stats)
+
+    def parse(self, input_text):
+        return self.machine.parse(input_text)
+
+    def check(self, input_text, max_errors=None):
+        return self.machine.check(input_text, max_errors)
+
+    def derive(self, input_text):
+        return self.machine.derive(input_text)
+
+    def parse_lines(self, lines):
+        return self.machine.parse_lines(lines)
+
+    def report(self, format="grid", page_size=None):
+        return self.reporter.report(format, page_size)
+
+
+CACHE_MAGIC = b"LL1C"
+CACHE_FORMAT = 5
+CACHE_HEADER = struct.Struct("<4sHH")
+# crc32 of the pickled table, after the version
+CACHE_CHECK = struct.Struct("<I")
+CACHE_LAYOUT = ",".join(ParseTable.FIELDS)
+
+
+def grammar_hash(grammar_text, format="text"):
+    key = f"{__version__}\0{CACHE_FORMAT}\0{CACHE_LAYOUT}\0{grammar_text}"
+    if format != "text":
+        # the same text read in another format is another grammar
+        key = f"{format}\0{key}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def save_table(path, table):
+    version = __version__.encode()
+    payload = pickle.dumps(table, pickle.HIGHEST_PROTOCOL)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_FORMAT, len(version)))
+        f.write(version)
+        f.write(CACHE_CHECK.pack(zlib.crc32(payload)))
+        f.write(payload)
+    os.replace(temp_path, path)
+
+
+def load_table(path):
+    # None when the file is missing, cut short or corrupt, or was written by
+    # another version or with another table layout. The file is unpickled,
+    # so it must come from a trusted cache dir
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, cache_format, version_size = CACHE_HEADER.unpack_from(data)
+    offset = CACHE_HEADER.size + version_size
+    if (
+        magic != CACHE_MAGIC
+        or cache_format != CACHE_FORMAT
+        or data[CACHE_HEADER.size : offset] != __version__.encode()
+        or len(data) < offset + CACHE_CHECK.size
+    ):
+        return None
+    (check,) = CACHE_CHECK.unpack_from(data, offset)
+    payload = memoryview(data)[offset + CACHE_CHECK.size :]
+    if zlib.crc32(payload) != check:
+        return None
+    try:
+        table = pickle.loads(payload)
+    except Exception:
+        # unpickling can fail in many ways, a bad file is only a cache miss
+        return None
+    if not isinstance(table, ParseTable) or vars(table).keys() != set(
+        ParseTable.FIELDS
+    ):
+        return None
+    return table
+
+
+def compile_grammar(grammar_text, cache_dir=None, format="text", stats=None):
+    # format is "text" or "json", for GrammarBuilder.from_json. Tables are
+    # pickled in cache_dir, which only trusted users may write to
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, grammar_hash(grammar_text, format) + ".ll1")
+        table = run_phase(stats, "load_table", lambda: load_table(path))
+        if stats is not None:
+            stats.count("table_cache_hits", table is not None)
+        if table is not None:
+            return table
+
+    if format == "json":
+        table = Grammar.from_json(grammar_text, compact=True, stats=stats).table
+    elif format == "text":
+        table = Grammar.from_text(grammar_text, compact=True, stats=stats).table
+    else:
+        raise ValueError(f"unknown grammar format {format!r}")
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        save_table(path, table)
+    return table
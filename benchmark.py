@@ -0,0 +1,256 @@
+import argparse
+import json
+import platform
+import random
+import string
+import sys
+import time
+
+from base import (
+    GrammarBuilder,
+    InputFileManager,
+    LexicalAnalyzer,
+    LexemeTypes,
+    LL1Machine,
+    SyntaxAnalyzer,
+    __version__,
+)
+
+# every alternative starts with one of these and every non-terminal use is
+# followed by a closer, FOLLOW sets never meet FIRST sets so the generated
+# grammars are always LL1, nullable or not
+STARTERS = string.ascii_letters
+CLOSERS = string.digits
+
+
+class SyntheticGrammar:
+    def __init__(self, non_terminals=100, alternatives=3, depth=5, epsilon=0.2, seed=0):
+        if not 1 <= alternatives <= len(STARTERS):
+            raise ValueError(f"alternatives must be between 1 and {len(STARTERS)}")
+        # <S> only uses <N0>, so every other non-terminal needs a level below it
+        if not min(2, non_terminals) <= depth <= non_terminals:
+            raise ValueError(
+                "depth must be between 2 and non_terminals, or 1 for one non-terminal"
+            )
+        self.params = {
+            "non_terminals": non_terminals,
+            "alternatives": alternatives,
+            "depth": depth,
+            "epsilon": epsilon,
+            "seed": seed,
+        }
+        self.random = random.Random(seed)
+
+        # <S> repeats <N0>, the other non-terminals are spread over the levels
+        # below it and only use the ones of the next level
+        levels = [["N0"]]
+        rest = [f"N{i}" for i in range(1, non_terminals)]
+        for level in range(1, depth):
+            size = len(rest) // (depth - level)
+            levels.append(rest[:size])
+            rest = rest[size:]
+
+        # a body is a starter then (non-terminal, closer) pairs
+        self.bodies = {"S": [[("N0", "0"), ("S", "")], []]}
+        for level, names in enumerate(levels):
+            below = levels[level + 1] if level + 1 < len(levels) else []
+            for name in names:
+                bodies = []
+                for starter in self.random.sample(STARTERS, alternatives):
+                    body = [starter]
+                    for _ in range(self.random.randint(0, 2) if below else 0):
+                        body.append(
+                            (self.random.choice(below), self.random.choice(CLOSERS))
+                        )
+                    bodies.append(body)
+                if self.random.random() < epsilon:
+                    bodies.append([])
+                self.bodies[name] = bodies
+            # every non-terminal is used, unreachable ones would be pruned
+            used = {part[0] for n in names for b in self.bodies[n] for part in b[1:]}
+            for name in below:
+                if name not in used:
+                    bodies = self.bodies[self.random.choice(names)]
+                    body = self.random.choice([b for b in bodies if b] or bodies)
+                    body.append((name, self.random.choice(CLOSERS)))
+
+    def text(self):
+        lines = []
+        for name, bodies in self.bodies.items():
+            alternatives = []
+            for body in bodies:
+                text = "".join(
+                    f"<{part[0]}>{part[1]}" if isinstance(part, tuple) else part
+                    for part in body
+                )
+                alternatives.append(text or "\\e")
+            lines.append(f"<{name}> -> {' | '.join(alternatives)};")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self):
+        # the same grammar for GrammarBuilder.from_dict
+        rules = {}
+        for name, bodies in self.bodies.items():
+            rules[name] = []
+            for body in bodies:
+                symbols = []
+                for part in body:
+                    if isinstance(part, tuple):
+                        symbols.append(f"<{part[0]}>")
+                        part = part[1]
+                    if part:
+                        symbols.append(part)
+                rules[name].append(symbols)
+        return rules
+
+    def sentence(self, length):
+        # valid input of at least length characters
+        out = []
+        size = 0
+        while size < length:
+            before = len(out)
+            self.derive("N0", out)
+            out.append("0")
+            size += len(out) - before
+        return "".join(out)
+
+    def derive(self, name, out):
+        body = self.random.choice(self.bodies[name])
+        for part in body:
+            if isinstance(part, tuple):
+                self.derive(part[0], out)
+                out.append(part[1])
+            else:
+                out.append(part)
+
+
+def best_time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def lex(grammar_text):
+    lexical_analyzer = LexicalAnalyzer(InputFileManager(grammar_text))
+    count = 0
+    for token_type, _, _ in lexical_analyzer.tokens():
+        count += token_type != LexemeTypes.END
+    return count
+
+
+def parse_rules(grammar_text):
+    syntax_analyzer = SyntaxAnalyzer(LexicalAnalyzer(InputFileManager(grammar_text)))
+    syntax_analyzer.parse_rules()
+    return syntax_analyzer.rules
+
+
+def bench_grammar(synthetic, lengths, repeat):
+    grammar_text = synthetic.text()
+    grammar_dict = synthetic.as_dict()
+    syntax_analyzer = SyntaxAnalyzer(
+        LexicalAnalyzer(InputFileManager(grammar_text)), compact=True
+    )
+    syntax_analyzer.parse()
+    machine = LL1Machine(syntax_analyzer)
+
+    result = {
+        "grammar": synthetic.params,
+        "rules": len(syntax_analyzer.rules),
+        "tokens": lex(grammar_text),
+        "valid_ll1": syntax_analyzer.valid_ll1,
+        "phases": {
+            "lex": best_time(lambda: lex(grammar_text), repeat),
+            "parse_rules": best_time(lambda: parse_rules(grammar_text), repeat),
+            "build": best_time(lambda: GrammarBuilder.from_dict(grammar_dict), repeat),
+            "firsts": best_time(syntax_analyzer.get_firsts, repeat),
+            "follows": best_time(syntax_analyzer.get_follows, repeat),
+            "rule_table": best_time(syntax_analyzer.create_rule_table, repeat),
+        },
+        "parse": [],
+    }
+    for length in lengths:
+        input_text = synthetic.sentence(length)
+        seconds = best_time(lambda: machine.parse(input_text), repeat)
+        result["parse"].append(
+            {
+                "length": len(input_text),
+                "accepted": machine.parse(input_text),
+                "seconds": seconds,
+                "chars_per_second": len(input_text) / seconds if seconds else None,
+            }
+        )
+    return result
+
+
+def compare(results, baseline):
+    # new / old time per phase, matched by grammar parameters and input index
+    old = {json.dumps(r["grammar"], sort_keys=True): r for r in baseline["results"]}
+    for result in results["results"]:
+        previous = old.get(json.dumps(result["grammar"], sort_keys=True))
+        if previous is None:
+            continue
+        print(result["grammar"])
+        for phase, seconds in result["phases"].items():
+            if previous["phases"].get(phase):
+                print(f"  {phase:<12}{seconds / previous['phases'][phase]:8.2f}x")
+        for new, old_parse in zip(result["parse"], previous["parse"]):
+            if old_parse["seconds"]:
+                ratio = new["seconds"] / old_parse["seconds"]
+                print(f"  parse {new['length']:<6}{ratio:8.2f}x")
+
+
+def int_list(text):
+    return [int(i) for i in text.split(",") if i]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time grammar analysis and LL1Machine.parse on synthetic grammars"
+    )
+    parser.add_argument(
+        "--non-terminals", type=int_list, default=[50, 200, 1000], help="e.g. 50,200"
+    )
+    parser.add_argument("--alternatives", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--epsilon", type=float, default=0.2)
+    parser.add_argument(
+        "--lengths", type=int_list, default=[1000, 10000, 100000], help="input sizes"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare", metavar="JSON", help="print time ratios against earlier results"
+    )
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * args.depth + 1000))
+    results = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [],
+    }
+    for non_terminals in args.non_terminals:
+        try:
+            synthetic = SyntheticGrammar(
+                non_terminals, args.alternatives, args.depth, args.epsilon, args.seed
+            )
+        except ValueError as error:
+            parser.error(f"{non_terminals} non-terminals: {error}")
+        result = bench_grammar(synthetic, args.lengths, args.repeat)
+        results["results"].append(result)
+        phases = " ".join(f"{k}={v * 1000:.2f}ms" for k, v in result["phases"].items())
+        print(f"{non_terminals} non-terminals, {result['rules']} rules: {phases}")
+        for run in result["parse"]:
+            print(f"  parse {run['length']} chars: {run['seconds'] * 1000:.2f}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
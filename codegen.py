@@ -0,0 +1,160 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import types
+
+from base import InvalidLL1Grammar, __version__, compile_grammar, grammar_hash
+
+# Emits a standalone parser module for one grammar. Every stack symbol is a
+# row dict from input character to the stack fragment it leaves once that
+# character is matched; for a non-terminal that is the result of its whole
+# chain of expansions, so it costs a single dict probe whatever the depth of
+# its leftmost derivation. A missing key is a syntax error and "" is the
+# input end.
+
+SKIP = "SKIP"
+
+TEMPLATE = """\
+# generated by codegen.py, do not edit
+VERSION = {version}
+GRAMMAR_HASH = {grammar_hash}
+
+# the non-terminal derives nothing before this character, pop it and go on
+SKIP = ("",)
+
+{rows}
+
+END = {{"": ()}}
+START = R{start}
+
+
+def parse(text):
+    stack = [END, START]
+    pop = stack.pop
+    extend = stack.extend
+    try:
+        for char in text:
+            push = pop()[char]
+            while push is SKIP:
+                push = pop()[char]
+            extend(push)
+        push = pop()[""]
+        while push is SKIP:
+            push = pop()[""]
+    except KeyError:
+        return False
+    return not stack
+
+
+def parse_lines(lines):
+    for line in lines:
+        yield parse(line.rstrip("\\r\\n"))
+"""
+
+
+def steps(table, non_terminal_id, terminal_id):
+    # the stack fragment left after non_terminal_id consumed terminal_id,
+    # SKIP when it derives epsilon first and None on an error
+    fragment = []
+    top = non_terminal_id
+    while True:
+        rule_id = table.cells[(top - table.n_terminals) * table.width + terminal_id]
+        if rule_id < 0:
+            return None
+        fragment.extend(table.pushes[rule_id])
+        if not fragment:
+            return SKIP
+        top = fragment.pop()
+        if top < table.n_terminals:
+            return fragment if top == terminal_id else None
+
+
+def generate_source(table, grammar_key=""):
+    if not table.valid_ll1:
+        raise InvalidLL1Grammar()
+
+    def render(symbol):
+        if symbol < table.n_terminals:
+            return f"T{symbol}"
+        return f"R{symbol - table.n_terminals}"
+
+    rows = [
+        f"T{i} = {{{json.dumps(terminal)}: ()}}"
+        for i, terminal in enumerate(table.terminals)
+        if i != table.end
+    ]
+    rows += [f"R{i} = {{}}" for i in range(len(table.non_terminals))]
+    for i in range(len(table.non_terminals)):
+        entries = []
+        for terminal_id, terminal in enumerate(table.terminals):
+            fragment = steps(table, table.n_terminals + i, terminal_id)
+            if fragment is None:
+                continue
+            if fragment is not SKIP:
+                items = [render(symbol) for symbol in fragment]
+                fragment = f"({', '.join(items)}{',' if len(items) == 1 else ''})"
+            char = "" if terminal_id == table.end else terminal
+            entries.append(f"        {json.dumps(char)}: {fragment},\n")
+        rows.append(f"R{i}.update(\n    {{\n{''.join(entries)}    }}\n)")
+
+    return TEMPLATE.format(
+        version=json.dumps(__version__),
+        grammar_hash=json.dumps(grammar_key),
+        rows="\n".join(rows),
+        start=table.start - table.n_terminals,
+    )
+
+
+def load_source(source, name):
+    module = types.ModuleType(name)
+    exec(compile(source, f"<{name}>", "exec"), module.__dict__)
+    return module
+
+
+def load_parser(grammar_text, cache_dir=None, format="text"):
+    # the generated module for grammar_text, written once to cache_dir and
+    # imported from there afterwards
+    key = grammar_hash(grammar_text, format)
+    name = f"ll1_{key[:16]}"
+    if not cache_dir:
+        table = compile_grammar(grammar_text, format=format)
+        return load_source(generate_source(table, key), name)
+
+    path = os.path.join(cache_dir, name + ".py")
+    if not os.path.exists(path):
+        source = generate_source(compile_grammar(grammar_text, cache_dir, format), key)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(source)
+        os.replace(temp_path, path)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a standalone parser module for an LL1 grammar"
+    )
+    parser.add_argument("grammar", help="grammar file, JSON when it ends with .json")
+    parser.add_argument("-o", "--output", help="module path (default: stdout)")
+    args = parser.parse_args()
+
+    with open(args.grammar, "r") as f:
+        grammar_text = f.read()
+    try:
+        grammar_format = "json" if args.grammar.endswith(".json") else "text"
+        table = compile_grammar(grammar_text, format=grammar_format)
+        source = generate_source(table, grammar_hash(grammar_text, grammar_format))
+    except InvalidLL1Grammar as error:
+        sys.exit(error.message)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
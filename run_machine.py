@@ -1,24 +1,139 @@
-from base import InputFileManager, LexicalAnalyzer, SyntaxAnalyzer, LL1Machine
+import argparse
+import atexit
+import json
+import sys
 
-with open("input.txt", "r") as f:
-    input_manger = InputFileManager(f.read())
-lexical_analyzer = LexicalAnalyzer(input_manger)
-syntax_analyzer = SyntaxAnalyzer(lexical_analyzer)
-syntax_analyzer.parse()
+from base import (
+    Grammar,
+    Limits,
+    LL1Machine,
+    Stats,
+    compile_grammar,
+    validate_file_parallel,
+)
 
-if not syntax_analyzer.valid_ll1:
-    print("Grammar is not a valid ll1")
-    exit()
+parser = argparse.ArgumentParser(description="Check inputs against an LL1 grammar")
+parser.add_argument(
+    "--grammar",
+    default="input.txt",
+    help="grammar file, rules as JSON (see GrammarBuilder) when it ends with .json",
+)
+parser.add_argument(
+    "--batch",
+    metavar="FILE",
+    help="validate every line of FILE ('-' for stdin) and stream the verdicts",
+)
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="number of worker processes used by --batch on a file",
+)
+parser.add_argument(
+    "--cache-dir",
+    help="keep compiled grammars in this directory and reuse them across runs",
+)
+parser.add_argument(
+    "--report",
+    choices=["grid", "csv", "json", "none"],
+    help="print the FIRST/FOLLOW and rule tables (default: grid unless --batch)",
+)
+parser.add_argument("--page-size", type=int, help="rows per report page")
+parser.add_argument(
+    "--codegen",
+    action="store_true",
+    help="run --batch with a parser module generated for the grammar",
+)
+parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="print phase times and machine counters as JSON to stderr on exit; "
+    "phase times overlap, lex is part of parse_rules",
+)
+parser.add_argument(
+    "--max-stack", type=int, help="reject inputs needing a deeper parse stack"
+)
+parser.add_argument(
+    "--max-steps-per-char",
+    type=int,
+    help="reject inputs taking more stack pops per character on average",
+)
+parser.add_argument("--time-budget", type=float, help="seconds allowed per input")
+parser.add_argument(
+    "--max-recoveries", type=int, help="stop reporting errors after this many"
+)
+args = parser.parse_args()
+if args.report is None:
+    args.report = "none" if args.batch else "grid"
+if args.codegen and args.workers > 1:
+    parser.error("--codegen does not support --workers")
 
-input_str = input("please write a input: ")
-is_ok = LL1Machine(syntax_analyzer).parse(input_str)
-if is_ok:
-    print('Input Accepted')
+bounds = (
+    args.max_stack, args.max_steps_per_char, args.time_budget, args.max_recoveries
+)
+limits = None
+if any(bound is not None for bound in bounds):
+    if args.codegen:
+        parser.error("limits are not supported by --codegen")
+    limits = Limits(*bounds)
+
+stats = None
+if args.stats:
+    stats = Stats()
+    atexit.register(lambda: print(json.dumps(stats.as_dict()), file=sys.stderr))
+
+with open(args.grammar, "r") as f:
+    grammar_text = f.read()
+grammar_format = "json" if args.grammar.endswith(".json") else "text"
+
+if args.report != "none":
+    if grammar_format == "json":
+        grammar = Grammar.from_json(grammar_text, compact=True, stats=stats)
+    else:
+        grammar = Grammar.from_text(grammar_text, compact=True, stats=stats)
+    print()
+    for chunk in grammar.report(args.report, args.page_size):
+        print(chunk)
+    table = grammar.table
 else:
-    print("Input Rejected")
+    table = compile_grammar(grammar_text, args.cache_dir, grammar_format, stats)
 
+if not table.valid_ll1:
+    print("Grammar is not a valid ll1")
+    exit()
 
+machine = LL1Machine(table=table, stats=stats, limits=limits)
 
+if args.batch and args.batch != "-" and args.workers > 1:
+    for is_ok in validate_file_parallel(
+        machine.table, args.batch, args.workers, limits=limits, stats=stats
+    ):
+        sys.stdout.write("Accepted\n" if is_ok else "Rejected\n")
+    exit()
 
+if args.batch:
+    if args.codegen:
+        from codegen import load_parser
 
+        machine = load_parser(grammar_text, args.cache_dir, grammar_format)
+    if args.batch == "-":
+        verdicts = machine.parse_lines(sys.stdin)
+    elif not args.codegen and table.byte_ids() is not None:
+        # validated over a memory map of the file, without decoding it
+        verdicts = machine.parse_file_lines(args.batch)
+    else:
+        verdicts = machine.parse_lines(open(args.batch, "r"))
+    for is_ok in verdicts:
+        sys.stdout.write("Accepted\n" if is_ok else "Rejected\n")
+    exit()
 
+input_str = input("please write a input: ")
+result = machine.check(input_str)
+for error in result.errors:
+    print(error)
+if result.limit is not None:
+    print(f"Stopped: {result.limit.value} limit exceeded")
+if result.accepted:
+    print('Input Accepted')
+else:
+    print("Input Rejected")
@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from base import Error, Grammar, Limits, LL1Machine, grammar_hash
+
+
+class GrammarCache:
+    # compiled grammars by content hash, least recently used ones are dropped
+    def __init__(self, max_size=128) -> None:
+        self.max_size = max_size
+        self.grammars = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, grammar_text, format="text"):
+        key = grammar_hash(grammar_text, format)
+        with self.lock:
+            grammar = self.grammars.get(key)
+            if grammar is not None:
+                self.hits += 1
+                self.grammars.move_to_end(key)
+                return grammar
+            self.misses += 1
+
+        if format == "json":
+            grammar = Grammar.from_json(grammar_text, compact=True)
+        else:
+            grammar = Grammar.from_text(grammar_text, compact=True)
+        with self.lock:
+            self.grammars[key] = grammar
+            if len(self.grammars) > self.max_size:
+                self.grammars.popitem(last=False)
+        return grammar
+
+
+def check_request(request):
+    # the inputs of a well formed request, ValueError otherwise
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    if "rules" not in request and not isinstance(request.get("grammar"), str):
+        raise ValueError("grammar must be a string")
+    inputs = request.get("inputs", [])
+    if not isinstance(inputs, list) or not all(isinstance(i, str) for i in inputs):
+        raise ValueError("inputs must be a list of strings")
+    return inputs
+
+
+class GrammarServer:
+    def __init__(
+        self,
+        cache_size=128,
+        max_pending=64,
+        timeout=5.0,
+        max_request=1 << 24,
+        limits=None,
+    ) -> None:
+        self.cache = GrammarCache(cache_size)
+        self.timeout = timeout
+        self.max_request = max_request
+        # a timed out request keeps its worker thread busy until it returns;
+        # with limits the inputs of a request also give up at its timeout.
+        # Compiling a grammar that is not cached is not bounded, only its size
+        # is by max_request
+        self.limits = limits
+        # bounds the requests being worked on across all connections
+        self.pending = asyncio.Semaphore(max_pending)
+        self.executor = ThreadPoolExecutor()
+
+    def validate(self, request, deadline=None):
+        # deadline is the time.monotonic() time the request times out at
+        inputs = check_request(request)
+        if "rules" in request:
+            # GrammarBuilder.from_dict rules, keyed by their JSON text
+            grammar = self.cache.get(json.dumps(request["rules"]), "json")
+        else:
+            grammar = self.cache.get(request["grammar"])
+        if not grammar.valid_ll1:
+            return {"valid_ll1": False, "verdicts": []}
+        if self.limits is None:
+            return {"valid_ll1": True, "verdicts": list(grammar.parse_lines(inputs))}
+        machine = LL1Machine(table=grammar.table, limits=self.limits.until(deadline))
+        results = list(machine.parse_lines(inputs))
+        return {
+            "valid_ll1": True,
+            "verdicts": [result.accepted for result in results],
+            # the limit that rejected each input, if any
+            "limits": [result.limit and result.limit.value for result in results],
+        }
+
+    async def handle_request(self, line):
+        try:
+            request = json.loads(line)
+            deadline = time.monotonic() + self.timeout
+            work = asyncio.get_running_loop().run_in_executor(
+                self.executor, self.validate, request, deadline
+            )
+            return await asyncio.wait_for(work, self.timeout)
+        except asyncio.TimeoutError:
+            return {"error": "timeout"}
+        except (ValueError, KeyError, TypeError) as error:
+            return {"error": f"bad request: {error}"}
+        except Error as error:
+            return {"error": error.message}
+        except Exception as error:
+            # a bug hit by one request must not drop the connection
+            return {"error": f"internal error: {type(error).__name__}: {error}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            # one request at a time per connection, the next one is not read
+            # before the previous response is drained
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                async with self.pending:
+                    response = await self.handle_request(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError: a request longer than max_request
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def start(self, path=None, host="127.0.0.1", port=None):
+        if path:
+            return await asyncio.start_unix_server(
+                self.handle_connection, path, limit=self.max_request
+            )
+        return await asyncio.start_server(
+            self.handle_connection, host, port, limit=self.max_request
+        )
+
+
+async def serve(args):
+    limits = Limits(
+        args.max_stack,
+        args.max_steps_per_char,
+        args.timeout if args.time_budget is None else args.time_budget,
+    )
+    grammar_server = GrammarServer(
+        args.cache_size, args.max_pending, args.timeout, limits=limits
+    )
+    server = await grammar_server.start(args.socket, port=args.port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        grammar_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve LL1 grammar checks as JSON lines, one request per line: "
+        '{"grammar": "...", "inputs": ["..."]} or {"rules": {...}, "inputs": [...]}'
+    )
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", help="listen on this unix socket")
+    address.add_argument("--port", type=int, help="listen on this localhost port")
+    parser.add_argument("--cache-size", type=int, default=128)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--max-stack", type=int)
+    parser.add_argument("--max-steps-per-char", type=int)
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="seconds per input (default: --timeout), every input of a request "
+        "also stops at the request's --timeout",
+    )
+    asyncio.run(serve(parser.parse_args()))
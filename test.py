@@ -1,21 +1,53 @@
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
 import unittest
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 import base
 from base import (
     InputFileManager,
+    InvalidCharacter,
+    InvalidLL1Grammar,
+    InvalidSemantic,
+    InvalidToken,
     Lexeme,
+    LeftRecursion,
+    Limit,
+    Limits,
     LexemeTypes,
     LexicalAnalyzer,
     LL1Machine,
+    ParseTable,
+    Grammar,
+    GrammarBuilder,
+    Recovery,
+    Stats,
     SyntaxAnalyzer,
+    UselessSymbolWarning,
+    compile_grammar,
     epsilon,
+    grammar_hash,
+    split_file,
     synch,
+    validate_file_parallel,
 )
+from benchmark import SyntheticGrammar, bench_grammar
+from codegen import generate_source, load_parser, load_source
+from server import GrammarServer
 
 
 class TestStringMethods(unittest.TestCase):
     def test1(self):
-        base.symbol_table = {}
         input_manger = InputFileManager(
             """
             <S> -> <A>a<B>b | <B>b<A>a;
@@ -67,7 +99,6 @@ class TestStringMethods(unittest.TestCase):
         self.assertTrue(ll1_machine.parse("ba"))
 
     def test2(self):
-        base.symbol_table = {}
         input_manger = InputFileManager(
             """
             <S> -> <A><B>;
@@ -132,7 +163,6 @@ class TestStringMethods(unittest.TestCase):
         self.assertTrue(ll1_machine.parse(""))
 
     def test3(self):
-        base.symbol_table = {}
         input_manger = InputFileManager(
             """
             <E> -> <T><E'>;
@@ -242,7 +272,6 @@ class TestStringMethods(unittest.TestCase):
 
 
     def test4(self):
-        base.symbol_table = {}
         input_manger = InputFileManager(
             """
             <S> -> i<E>t<S><S'> | a;
@@ -301,7 +330,6 @@ class TestStringMethods(unittest.TestCase):
         self.assertFalse(syntax_analyzer.valid_ll1)
 
     def test5(self):
-        base.symbol_table = {}
         input_manger = InputFileManager(
             """
             <S> -> <A>a;
@@ -381,5 +409,870 @@ class TestStringMethods(unittest.TestCase):
         self.assertTrue(ll1_machine.parse("a"))
         self.assertTrue(ll1_machine.parse("da"))
 
+
+EXPRESSION_GRAMMAR = """
+    <E> -> <T><E'>;
+    <E'> -> +<T><E'> | \\e;
+    <T> -> <F><T'>;
+    <T'> -> *<F><T'> | \\e;
+    <F> -> (<E>) | i;
+"""
+
+
+def build_analyzer(grammar):
+    syntax_analyzer = SyntaxAnalyzer(LexicalAnalyzer(InputFileManager(grammar)))
+    syntax_analyzer.parse()
+    return syntax_analyzer
+
+
+class TestLexeme(unittest.TestCase):
+    def test_interning(self):
+        lexeme = Lexeme("x", LexemeTypes.TERMINAL)
+        self.assertIs(lexeme, Lexeme("x", LexemeTypes.TERMINAL))
+        self.assertIsNot(lexeme, Lexeme("x", LexemeTypes.NON_TERMINAL))
+        self.assertIs(pickle.loads(pickle.dumps(lexeme)), lexeme)
+        self.assertFalse(hasattr(lexeme, "__dict__"))
+
+        # lexemes nothing uses any more are not kept
+        grammar = Grammar.from_text("<Unused> -> a;")
+        self.assertIn(("Unused", LexemeTypes.NON_TERMINAL), Lexeme.interned)
+        del grammar
+        gc.collect()
+        self.assertNotIn(("Unused", LexemeTypes.NON_TERMINAL), Lexeme.interned)
+
+    def test_compatible_equality(self):
+        lexeme = Lexeme("x", LexemeTypes.TERMINAL)
+        self.assertEqual(lexeme, "x")
+        self.assertEqual(lexeme, Lexeme("x", LexemeTypes.NON_TERMINAL))
+        self.assertNotEqual(lexeme, Lexeme("y", LexemeTypes.TERMINAL))
+        self.assertIn("x", {lexeme})
+        self.assertEqual(hash(lexeme), hash("x"))
+
+
+class TestLexicalAnalyzer(unittest.TestCase):
+    def tokens(self, text):
+        lexical_analyzer = LexicalAnalyzer(InputFileManager(text))
+        tokens = []
+        while True:
+            token = lexical_analyzer.get_token()
+            if token.type == LexemeTypes.END:
+                return tokens
+            tokens.append((token.value, token.type))
+
+    def test_tokens(self):
+        tokens = self.tokens("<A'> -> a\\w<B> // one\n | \\e {two\n}\t;")
+        self.assertEqual(
+            tokens,
+            [
+                ("A'", LexemeTypes.NON_TERMINAL),
+                ("->", LexemeTypes.ASSIGN),
+                ("a", LexemeTypes.TERMINAL),
+                (" ", LexemeTypes.TERMINAL),
+                ("B", LexemeTypes.NON_TERMINAL),
+                ("|", LexemeTypes.OR),
+                ("epsilon", LexemeTypes.TERMINAL),
+                (";", LexemeTypes.INSTRUCTION_END),
+            ],
+        )
+
+    def test_token_stream(self):
+        text = "<Ab> -> x<Ab> | \\e;"
+        tokens = list(LexicalAnalyzer(InputFileManager(text)).tokens())
+        self.assertEqual(
+            tokens[:-1],
+            [
+                (LexemeTypes.NON_TERMINAL, "Ab", 0),
+                (LexemeTypes.ASSIGN, "->", 5),
+                (LexemeTypes.TERMINAL, "x", 8),
+                (LexemeTypes.NON_TERMINAL, "Ab", 9),
+                (LexemeTypes.OR, "|", 14),
+                (LexemeTypes.TERMINAL, "epsilon", 16),
+                (LexemeTypes.INSTRUCTION_END, ";", 18),
+            ],
+        )
+        self.assertEqual(tokens[-1][0], LexemeTypes.END)
+        self.assertIs(tokens[0][1], tokens[3][1])
+
+        rules = build_analyzer(EXPRESSION_GRAMMAR).rules
+        self.assertIs(rules[0][1][1], rules[1][0])
+        self.assertIs(rules[1][1][2], rules[1][0])
+
+    def test_error_positions(self):
+        with self.assertRaises(InvalidCharacter) as context:
+            self.tokens("<A> -> a;\n  \n   <B> -> b.;")
+        self.assertIn("line 3, number 12", context.exception.message)
+        with self.assertRaises(InvalidToken) as context:
+            self.tokens("<A> -> a;\n<B c> -> b;")
+        self.assertIn("line 2, number 3", context.exception.message)
+        with self.assertRaises(InvalidToken):
+            self.tokens("<A> -> a; { open")
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_deep_grammar(self):
+        depth = 1500
+        grammar = "".join(f"<N{i}> -> <N{i + 1}>a | b;" for i in range(depth))
+        syntax_analyzer = build_analyzer(grammar + f"<N{depth}> -> c | \\e;")
+        first = Lexeme("N0", LexemeTypes.NON_TERMINAL)
+        last = Lexeme(f"N{depth}", LexemeTypes.NON_TERMINAL)
+        analyze_table = syntax_analyzer.analyze_table
+        self.assertEqual(analyze_table["firsts"][first], {"a", "b", "c"})
+        self.assertEqual(analyze_table["follows"][last], {"a"})
+
+    def test_repeated_symbol_follows(self):
+        syntax_analyzer = build_analyzer(
+            """
+            <S> -> <A><A><B>;
+            <A> -> c;
+            <B> -> a;
+            """
+        )
+        follows = syntax_analyzer.analyze_table["follows"]
+        self.assertEqual(follows[Lexeme("A", LexemeTypes.NON_TERMINAL)], {"a", "c"})
+
+    def test_compact_bitsets(self):
+        syntax_analyzer = SyntaxAnalyzer(
+            LexicalAnalyzer(InputFileManager(EXPRESSION_GRAMMAR)), compact=True
+        )
+        syntax_analyzer.parse()
+        self.assertEqual(syntax_analyzer.analyze_table["firsts"], {})
+        bit_table = syntax_analyzer.bit_table
+        e_dash = Lexeme("E'", LexemeTypes.NON_TERMINAL)
+        self.assertIsInstance(bit_table["firsts"][e_dash], int)
+        self.assertEqual(
+            syntax_analyzer.expand(bit_table["firsts"][e_dash]), {"+", epsilon}
+        )
+
+        syntax_analyzer.expand_analyze_table()
+        expected = build_analyzer(EXPRESSION_GRAMMAR).analyze_table
+        self.assertDictEqual(syntax_analyzer.analyze_table, expected)
+
+    def test_left_recursion(self):
+        with self.assertRaises(InvalidSemantic):
+            build_analyzer("<S> -> <A>a; <A> -> <B> | b; <B> -> <S>c;")
+
+        with self.assertRaises(LeftRecursion) as context:
+            build_analyzer(
+                """
+                <S> -> <X> | <Z>s;
+                <X> -> <N><Y>x | x;
+                <N> -> n | \\e;
+                <Y> -> <X>y;
+                <Z> -> <Z>z | z;
+                """
+            )
+        cycles = [[s.value for s in cycle] for cycle in context.exception.cycles]
+        self.assertEqual(cycles, [["X", "Y"], ["Z"]])
+        self.assertIn("<X> -> <Y> -> <X>; <Z> -> <Z>", context.exception.message)
+
+    def test_useless_symbols(self):
+        grammar_text = """
+            <S> -> a<A> | <B>b | c;
+            <A> -> a | <C>;
+            <B> -> <B>b;
+            <C> -> c<C>;
+            <D> -> d;
+        """
+        with self.assertWarns(UselessSymbolWarning) as context:
+            grammar = Grammar.from_text(grammar_text)
+        warning = context.warning
+        self.assertEqual([s.value for s in warning.non_productive], ["B", "C"])
+        self.assertEqual([s.value for s in warning.unreachable], ["D"])
+        self.assertEqual(len(warning.rules), 5)
+        self.assertEqual(len(grammar.rules), 3)
+        self.assertEqual([s.value for s in grammar.rule_table], ["S", "A"])
+        self.assertEqual(grammar.table.non_terminals, ["S", "A"])
+        self.assertTrue(grammar.valid_ll1)
+        self.assertTrue(grammar.parse("aa"))
+        self.assertFalse(grammar.parse("bb"))
+
+        syntax_analyzer = grammar.analyzer
+        s = Lexeme("S", LexemeTypes.NON_TERMINAL)
+        d = Lexeme("D", LexemeTypes.NON_TERMINAL)
+        self.assertIn("renumbered", str(warning))
+        with self.assertWarns(UselessSymbolWarning):
+            syntax_analyzer.add_production(s, [d])
+        self.assertEqual(len(syntax_analyzer.rules), 5)
+        self.assertIn(d, syntax_analyzer.rule_table)
+
+        # edits that leave every rule useful do not prune again
+        e = Lexeme("E", LexemeTypes.NON_TERMINAL)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            terminal = Lexeme("e", LexemeTypes.TERMINAL)
+            syntax_analyzer.edit(added=[(d, [e]), (e, [terminal])])
+            syntax_analyzer.add_production(e, [Lexeme("f", LexemeTypes.TERMINAL)])
+        self.assertEqual(len(syntax_analyzer.rules), 8)
+        with self.assertWarns(UselessSymbolWarning) as context:
+            syntax_analyzer.remove_production(len(syntax_analyzer.rules) - 3)
+        self.assertEqual([s.value for s in context.warning.unreachable], ["E"])
+        self.assertEqual(len(syntax_analyzer.rules), 5)
+
+        syntax_analyzer = build_analyzer("<S> -> a<A>; <A> -> a | b<A>;")
+        with self.assertRaises(InvalidSemantic):
+            syntax_analyzer.remove_production(1)
+        self.assertEqual(len(syntax_analyzer.rules), 3)
+
+        with self.assertRaises(InvalidSemantic):
+            build_analyzer("<S> -> a<S>;")
+
+        # the start symbol stays the same when its first rule is left out
+        grammar_text = "<S> -> <B>; <A> -> a; <S> -> <A>c; <B> -> b<B>;"
+        with self.assertWarns(UselessSymbolWarning):
+            grammar = Grammar.from_text(grammar_text)
+        self.assertTrue(grammar.parse("ac"))
+        self.assertFalse(grammar.parse("a"))
+        syntax_analyzer = build_analyzer("<S> -> <A>c; <A> -> a; <S> -> d;")
+        with self.assertWarns(UselessSymbolWarning):
+            syntax_analyzer.remove_production(0)
+        grammar = Grammar(syntax_analyzer)
+        self.assertTrue(grammar.parse("d"))
+        self.assertFalse(grammar.parse("a"))
+
+    def test_incremental_edit(self):
+        syntax_analyzer = build_analyzer(EXPRESSION_GRAMMAR)
+        e_dash = Lexeme("E'", LexemeTypes.NON_TERMINAL)
+        t = Lexeme("T", LexemeTypes.NON_TERMINAL)
+        plus = Lexeme("+", LexemeTypes.TERMINAL)
+
+        changes = syntax_analyzer.add_production(e_dash, [plus, t])
+        self.assertEqual(changes["created"], {(e_dash, plus)})
+        self.assertFalse(syntax_analyzer.valid_ll1)
+        changes = syntax_analyzer.remove_production(len(syntax_analyzer.rules) - 1)
+        self.assertEqual(changes["resolved"], {(e_dash, plus)})
+        self.assertTrue(syntax_analyzer.valid_ll1)
+
+        minus = Lexeme("-", LexemeTypes.TERMINAL)
+        syntax_analyzer.replace_productions(e_dash, [[minus, t, e_dash], [epsilon]])
+        fresh = SyntaxAnalyzer()
+        fresh.rules = syntax_analyzer.rules
+        fresh.analyze()
+        self.assertDictEqual(syntax_analyzer.analyze_table, fresh.analyze_table)
+        self.assertDictEqual(syntax_analyzer.rule_table, fresh.rule_table)
+
+        with self.assertRaises(InvalidSemantic):
+            undefined = Lexeme("X", LexemeTypes.NON_TERMINAL)
+            syntax_analyzer.add_production(e_dash, [undefined])
+        self.assertEqual(syntax_analyzer.rules, fresh.rules)
+
+        # any failure rolls the edit back
+        rules = list(syntax_analyzer.rules)
+        rule_table = dict(syntax_analyzer.rule_table)
+        with mock.patch.object(syntax_analyzer, "reanalyze", side_effect=MemoryError):
+            with self.assertRaises(MemoryError):
+                syntax_analyzer.add_production(e_dash, [minus, t])
+        self.assertEqual(syntax_analyzer.rules, rules)
+        self.assertDictEqual(syntax_analyzer.rule_table, rule_table)
+
+        syntax_analyzer = GrammarBuilder().add("S", ["a"]).analyzer()
+        with self.assertRaises(InvalidSemantic):
+            syntax_analyzer.remove_production(0)
+        self.assertEqual(len(syntax_analyzer.rules), 1)
+
+    def assertSameAnalysis(self, syntax_analyzer):
+        fresh = SyntaxAnalyzer()
+        fresh.rules = list(syntax_analyzer.rules)
+        fresh.analyze()
+        self.assertDictEqual(syntax_analyzer.analyze_table, fresh.analyze_table)
+        self.assertDictEqual(syntax_analyzer.rule_table, fresh.rule_table)
+        self.assertEqual(syntax_analyzer.conflicts, fresh.conflicts)
+
+    def test_incremental_rows(self):
+        syntax_analyzer = build_analyzer(EXPRESSION_GRAMMAR)
+        grammar = Grammar(syntax_analyzer)
+        e_dash = Lexeme("E'", LexemeTypes.NON_TERMINAL)
+        t = Lexeme("T", LexemeTypes.NON_TERMINAL)
+        plus = Lexeme("+", LexemeTypes.TERMINAL)
+        rule_table = dict(syntax_analyzer.rule_table)
+        firsts = dict(syntax_analyzer.analyze_table["firsts"])
+
+        syntax_analyzer.add_production(e_dash, [plus, t])
+        for left, row in syntax_analyzer.rule_table.items():
+            self.assertEqual(row is rule_table[left], left != e_dash, left)
+        for left, first in syntax_analyzer.analyze_table["firsts"].items():
+            self.assertIs(first, firsts[left])
+        self.assertSameAnalysis(syntax_analyzer)
+        # the grammar keeps the tables it was made with
+        self.assertEqual(len(grammar.rules), 8)
+        self.assertEqual(grammar.rule_table, rule_table)
+
+        # the rows of rules after a removed one are only renumbered
+        f = Lexeme("F", LexemeTypes.NON_TERMINAL)
+        rule_table = dict(syntax_analyzer.rule_table)
+        syntax_analyzer.remove_production(4)
+        for left, row in syntax_analyzer.rule_table.items():
+            self.assertEqual(row is rule_table[left], left in ("E", "T"), left)
+        self.assertEqual(syntax_analyzer.rule_table[f]["i"], [6])
+        self.assertSameAnalysis(syntax_analyzer)
+        with self.assertRaises(InvalidSemantic):
+            syntax_analyzer.remove_production(syntax_analyzer.productions[t][0])
+        self.assertRaises(IndexError, syntax_analyzer.remove_production, 100)
+
+        # random edits, some left recursive, match a fresh analysis
+        synthetic = SyntheticGrammar(100, 3, 6, 0.5, seed=2)
+        syntax_analyzer = GrammarBuilder.from_dict(synthetic.as_dict()).analyzer()
+        rng = random.Random(4)
+        lefts = list(syntax_analyzer.productions)
+        errors = 0
+        for _ in range(60):
+            left = rng.choice(lefts[1:])
+            other = rng.choice(lefts)
+            bodies = [[], ["#"], [other], [other, "7"], ["a", other], [left, "7"]]
+            rights = [GrammarBuilder.symbol(s) for s in rng.choice(bodies)]
+            before = syntax_analyzer.rule_table.copy()
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", UselessSymbolWarning)
+                    if rng.random() < 0.5:
+                        syntax_analyzer.add_production(left, rights)
+                    else:
+                        ids = syntax_analyzer.productions[left]
+                        syntax_analyzer.remove_production(rng.choice(ids))
+            except InvalidSemantic:
+                errors += 1
+                self.assertEqual(syntax_analyzer.rule_table, before)
+            self.assertSameAnalysis(syntax_analyzer)
+        self.assertGreater(errors, 0)
+
+
+class TestGrammar(unittest.TestCase):
+    def test_independent_grammars(self):
+        expression = Grammar.from_text(EXPRESSION_GRAMMAR)
+        pairs = Grammar.from_text("<S> -> a<S>b | \\e;")
+        self.assertEqual(len(expression.rules), 8)
+        self.assertEqual(len(pairs.rules), 2)
+        self.assertTrue(expression.parse("i+i"))
+        self.assertFalse(expression.parse("aabb"))
+        self.assertTrue(pairs.parse("aabb"))
+        self.assertFalse(pairs.parse("i+i"))
+
+    def test_threads(self):
+        grammar = Grammar.from_text(EXPRESSION_GRAMMAR)
+        inputs = ["i+i*(i+i)", "(i", "i*i+i", "+i"] * 200
+        expected = [grammar.parse(text) for text in inputs]
+        with ThreadPoolExecutor(8) as pool:
+            self.assertEqual(list(pool.map(grammar.parse, inputs)), expected)
+            results = list(pool.map(grammar.check, inputs))
+        self.assertEqual([result.accepted for result in results], expected)
+
+
+    def test_report(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            grammar = Grammar.from_text(EXPRESSION_GRAMMAR)
+        self.assertEqual(output.getvalue(), "")
+
+        chunks = list(grammar.report("csv"))
+        self.assertEqual(chunks[0], "Non-Terminal,First,Follow")
+        self.assertEqual(chunks[1].splitlines()[0], "E,( i,$ )")
+        self.assertIn("F,synch,synch,6,synch,7,synch", chunks[3])
+
+        pages = list(grammar.report("json", page_size=2))
+        self.assertEqual(len(pages), 6)
+        row = json.loads(pages[0].splitlines()[1])
+        self.assertEqual(row["First"], ["+", "epsilon"])
+
+        grids = list(grammar.report("grid"))
+        self.assertEqual(len(grids), 2)
+        self.assertIn("Non-Terminal", grids[1])
+        with self.assertRaises(ValueError):
+            next(grammar.report("xml"))
+
+    def test_report_after_edit(self):
+        # the report shows the rules the grammar parses with, not later edits
+        grammar = Grammar.from_text(EXPRESSION_GRAMMAR)
+        before = list(grammar.report("csv"))
+        e_dash = Lexeme("E'", LexemeTypes.NON_TERMINAL)
+        minus = Lexeme("-", LexemeTypes.TERMINAL)
+        t = Lexeme("T", LexemeTypes.NON_TERMINAL)
+        grammar.analyzer.add_production(e_dash, [minus, t])
+        self.assertEqual(list(grammar.report("csv")), before)
+        self.assertFalse(grammar.parse("i-i"))
+        self.assertIn("-", list(Grammar(grammar.analyzer).report("csv"))[2])
+
+
+class TestParseTable(unittest.TestCase):
+    def test_compiled_cells(self):
+        table = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR)).table
+        self.assertEqual(table.terminals[0], "$")
+        self.assertEqual(table.lookup("E", "("), 0)
+        self.assertEqual(table.lookup("T'", "+"), 5)
+        self.assertEqual(table.lookup("F", "+"), ParseTable.SYNCH)
+        self.assertEqual(table.lookup("E", "+"), ParseTable.ERROR)
+        self.assertEqual(table.lookup("E", "x"), ParseTable.ERROR)
+        self.assertEqual(len(table.cells), len(table.non_terminals) * table.width)
+
+        ids = table.non_terminal_ids
+        self.assertEqual(table.pushes[0], (ids["E'"], ids["T"]))
+        self.assertEqual(table.pushes[2], ())
+        terminal_ids = table.terminal_ids
+        self.assertEqual(
+            table.pushes[6], (terminal_ids[")"], ids["E"], terminal_ids["("])
+        )
+
+
+class TestGrammarCache(unittest.TestCase):
+    def test_compile_grammar_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            table = compile_grammar(EXPRESSION_GRAMMAR, directory)
+            path = os.path.join(directory, grammar_hash(EXPRESSION_GRAMMAR) + ".ll1")
+            self.assertTrue(os.path.exists(path))
+
+            cached = compile_grammar(EXPRESSION_GRAMMAR, directory)
+            self.assertEqual(cached.cells.tobytes(), table.cells.tobytes())
+            self.assertEqual(cached.non_terminal_ids, table.non_terminal_ids)
+            self.assertTrue(cached.valid_ll1)
+            self.assertTrue(LL1Machine(table=cached).parse("i+(i*i)"))
+
+            # a file written by another version is ignored and replaced
+            with open(path, "r+b") as f:
+                f.seek(8)
+                f.write(b"9")
+            self.assertTrue(compile_grammar(EXPRESSION_GRAMMAR, directory).valid_ll1)
+            version = base.__version__.encode()
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(8 + len(version))[8:], version)
+
+            # and so is a file cut short or corrupted
+            with open(path, "rb") as f:
+                data = f.read()
+            for broken in [data[: len(data) // 2], data[:-1] + b"\0"]:
+                with open(path, "wb") as f:
+                    f.write(broken)
+                self.assertIsNone(base.load_table(path))
+                cached = compile_grammar(EXPRESSION_GRAMMAR, directory)
+                self.assertTrue(LL1Machine(table=cached).parse("i+(i*i)"))
+
+            # so is a table pickled with another layout under the same key
+            self.assertEqual(vars(table).keys(), set(ParseTable.FIELDS))
+            del cached.char_ids
+            base.save_table(path, cached)
+            self.assertIsNone(base.load_table(path))
+            machine = LL1Machine(table=compile_grammar(EXPRESSION_GRAMMAR, directory))
+            self.assertTrue(machine.parse_stream(["i+", "i"]))
+
+
+class TestLL1Machine(unittest.TestCase):
+    def test_parse_lines(self):
+        ll1_machine = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR))
+        lines = ["i+i*i\n", "(i*i)+i\r\n", ")i*+i\n", "i", "", "i*(i+i)"]
+        self.assertEqual(
+            list(ll1_machine.parse_lines(lines)),
+            [True, True, False, True, False, True],
+        )
+
+
+    def test_validate_file_parallel(self):
+        table = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR)).table
+        self.assertEqual(
+            pickle.loads(pickle.dumps(table)).cells.tobytes(), table.cells.tobytes()
+        )
+        lines = ["i+i", "(i", "i*(i+i)", "", "i*i*i+i"] * 50
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "inputs.txt")
+            with open(path, "w") as f:
+                f.write("\n".join(lines))
+            ranges = split_file(path, 7)
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], os.path.getsize(path))
+            verdicts = list(validate_file_parallel(table, path, workers=2))
+            stats = Stats()
+            traced = list(validate_file_parallel(table, path, workers=2, stats=stats))
+        self.assertEqual(verdicts, list(LL1Machine(table=table).parse_lines(lines)))
+        self.assertEqual(traced, verdicts)
+        serial = Stats()
+        list(LL1Machine(table=table, stats=serial).parse_lines(lines))
+        self.assertEqual(stats.counts, serial.counts)
+        self.assertEqual(stats.production_hits, serial.production_hits)
+
+
+    def test_parse_stream(self):
+        ll1_machine = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR))
+        self.assertTrue(ll1_machine.parse_stream(["(i+", "i)*", "i"]))
+        self.assertFalse(ll1_machine.parse_stream(["(i+", "i)*"]))
+        self.assertTrue(ll1_machine.parse_stream([b"i*(i", b"+i)"]))
+        self.assertFalse(ll1_machine.parse_stream(["i$", "+i"]))
+        self.assertFalse(ll1_machine.parse_stream(["i+", b"\xc3", b"\xa9"]))
+
+        text = "+".join(["(i*i)"] * 1000)
+        self.assertTrue(ll1_machine.parse_stream(io.StringIO(text), chunk_size=7))
+        self.assertTrue(ll1_machine.parse_stream(io.BytesIO(text.encode()), 5))
+        self.assertFalse(ll1_machine.parse_stream(io.BytesIO(text.encode() + b"+")))
+
+    def test_parse_bytes(self):
+        ll1_machine = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR))
+        text = "+".join(["(i*i)"] * 1000)
+        self.assertTrue(ll1_machine.parse_bytes(text.encode(), chunk_size=7))
+        self.assertFalse(ll1_machine.parse_bytes(text.encode() + b"+"))
+        self.assertFalse(ll1_machine.parse_bytes(b"i$"))
+        self.assertFalse(ll1_machine.parse_bytes("i+\xe9".encode()))
+
+        lines = ["i+i*i\n", "(i*i)+i\r\n", ")i*+i\n", "i\r\r\n", "\n", "i$\n"]
+        lines.append("i*(i)")
+        expected = list(ll1_machine.parse_lines(lines))
+        data = "".join(lines).encode()
+        verdicts = ll1_machine.parse_byte_lines(data, chunk_size=4)
+        self.assertEqual(list(verdicts), expected)
+        self.assertEqual(list(ll1_machine.parse_byte_lines(data, 6, 21)), expected[1:3])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "inputs.txt")
+            with open(path, "wb") as f:
+                f.write(data)
+            self.assertEqual(list(ll1_machine.parse_file_lines(path)), expected)
+            self.assertFalse(ll1_machine.parse_file(path))
+            open(path, "wb").close()
+            self.assertFalse(ll1_machine.parse_file(path))
+            self.assertEqual(list(ll1_machine.parse_file_lines(path)), [])
+
+    def test_derive(self):
+        grammar = Grammar.from_text(EXPRESSION_GRAMMAR)
+        derivation = grammar.derive("i+i")
+        self.assertEqual(list(derivation.productions), [0, 3, 7, 5, 1, 3, 7, 5, 2])
+        self.assertEqual(list(derivation.offsets), [0, 0, 0, 1, 1, 2, 2, 3, 3])
+        self.assertIsNone(grammar.derive("i+"))
+        self.assertIsNone(grammar.derive("i$"))
+
+        root = derivation.tree()
+        self.assertFalse(hasattr(root, "__dict__"))
+        self.assertEqual((root.symbol, root.rule, root.start, root.end), ("E", 0, 0, 3))
+        t, e_dash = root.children
+        self.assertEqual((t.symbol, t.start, t.end), ("T", 0, 1))
+        self.assertEqual((e_dash.symbol, e_dash.start, e_dash.end), ("E'", 1, 3))
+        plus, t, e_dash = e_dash.children
+        self.assertEqual((plus.value, plus.offset), ("+", 1))
+        self.assertEqual(t.children[0].children[0].offset, 2)
+        self.assertEqual((e_dash.rule, e_dash.start, e_dash.end), (2, 3, 3))
+        self.assertEqual(e_dash.children, [])
+
+    def test_check_errors(self):
+        ll1_machine = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR))
+        result = ll1_machine.check("i+i*i")
+        self.assertTrue(result.accepted)
+        self.assertEqual(result.errors, [])
+
+        result = ll1_machine.check(")i*+i")
+        self.assertFalse(result.accepted)
+        self.assertEqual(
+            [(e.position, e.char, e.action) for e in result.errors],
+            [(1, ")", Recovery.SKIP), (4, "+", Recovery.SYNCH)],
+        )
+        self.assertEqual(set(result.errors[0].expected), {"(", "i"})
+
+        result = ll1_machine.check("(i", max_errors=1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0].expected, (")",))
+        self.assertEqual(
+            str(result.errors[0]), "Expected ')' but got '$' in character number 3"
+        )
+
+    def test_check_reset_loop(self):
+        # "c" only follows <S>, resetting to <S> again used to loop forever
+        grammar = Grammar.from_text("<S> -> x<S>c | \\e;")
+        result = grammar.check("c")
+        self.assertFalse(result.accepted)
+        self.assertEqual(
+            [(e.position, e.action) for e in result.errors],
+            [(1, Recovery.RESET), (1, Recovery.SKIP)],
+        )
+        self.assertEqual(len(grammar.check("c" * 1000).errors), 2000)
+        self.assertEqual(len(grammar.check("xcc").errors), 2)
+        # with limits and with max_errors as well
+        ll1_machine = LL1Machine(table=grammar.table, limits=Limits())
+        self.assertEqual(repr(ll1_machine.check("c")), repr(result))
+        self.assertEqual(len(grammar.check("cc", max_errors=3).errors), 3)
+
+    def test_limits(self):
+        table = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR)).table
+        nested = "(" * 10000 + "i" + ")" * 10000
+        ll1_machine = LL1Machine(table=table, limits=Limits(max_stack=100))
+        self.assertTrue(ll1_machine.parse("((i))"))
+        self.assertEqual(ll1_machine.parse(nested).limit, Limit.STACK)
+        self.assertEqual(ll1_machine.check(nested).limit, Limit.STACK)
+        results = ll1_machine.parse_byte_lines(b"(i)\n(i\n" + b"(" * 50 + b"\n")
+        self.assertEqual(
+            [(r.accepted, r.limit) for r in results],
+            [(True, None), (False, None), (False, Limit.STACK)],
+        )
+
+        ll1_machine = LL1Machine(table=table, limits=Limits(max_steps_per_char=1))
+        self.assertEqual(ll1_machine.parse("i+i").limit, Limit.STEPS)
+        ll1_machine = LL1Machine(table=table, limits=Limits(time_budget=0))
+        self.assertEqual(ll1_machine.parse(nested).limit, Limit.TIME)
+
+        # growth within one character and at the end of the input is caught
+        table = Grammar.from_text("<S> -> <A><A><A>a; <A> -> \\e;").table
+        ll1_machine = LL1Machine(table=table, limits=Limits(max_stack=3))
+        self.assertEqual(ll1_machine.parse("a").limit, Limit.STACK)
+        self.assertEqual(ll1_machine.check("a").limit, Limit.STACK)
+        table = Grammar.from_text("<S> -> a<B>; <B> -> <C>; <C> -> \\e;").table
+        ll1_machine = LL1Machine(table=table, limits=Limits(max_steps_per_char=1))
+        self.assertEqual(ll1_machine.parse("a").limit, Limit.STEPS)
+        self.assertEqual(ll1_machine.check("a").limit, Limit.STEPS)
+        table = LL1Machine(build_analyzer(EXPRESSION_GRAMMAR)).table
+        ll1_machine = LL1Machine(table=table, limits=Limits(max_recoveries=3))
+        result = ll1_machine.check(")" * 1000)
+        self.assertEqual((result.limit, len(result.errors)), (Limit.RECOVERIES, 4))
+
+
+class TestServer(unittest.TestCase):
+    def test_requests(self):
+        async def scenario():
+            grammar_server = GrammarServer(cache_size=1)
+            server = await grammar_server.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for request in [
+                {"grammar": EXPRESSION_GRAMMAR, "inputs": ["i+i", "(i"]},
+                {"grammar": EXPRESSION_GRAMMAR, "inputs": ["i*(i)"]},
+                {"grammar": "<S> -> a | a<S>;", "inputs": ["a"]},
+                {"rules": {"S": [["a", "<S>"], []]}, "inputs": ["aa", "b"]},
+                {"grammar": "<S> -> ;;"},
+                {"inputs": []},
+                {"grammar": EXPRESSION_GRAMMAR, "inputs": [5]},
+                {"grammar": EXPRESSION_GRAMMAR, "inputs": "i+i"},
+                {"grammar": ["<S> -> a;"]},
+                ["i+i"],
+                {"grammar": EXPRESSION_GRAMMAR, "inputs": ["i"]},
+            ]:
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            grammar_server.close()
+            return grammar_server, responses
+
+        grammar_server, responses = asyncio.run(scenario())
+        self.assertEqual(responses[0], {"valid_ll1": True, "verdicts": [True, False]})
+        self.assertEqual(responses[1], {"valid_ll1": True, "verdicts": [True]})
+        self.assertEqual(responses[2], {"valid_ll1": False, "verdicts": []})
+        self.assertEqual(responses[3], {"valid_ll1": True, "verdicts": [True, False]})
+        self.assertIn("error", responses[4])
+        self.assertIn("error", responses[5])
+        for response in responses[6:10]:
+            self.assertTrue(response["error"].startswith("bad request"), response)
+        self.assertEqual(responses[10], {"valid_ll1": True, "verdicts": [True]})
+        self.assertEqual(grammar_server.cache.hits, 1)
+        self.assertEqual(len(grammar_server.cache.grammars), 1)
+
+    def test_unexpected_error(self):
+        async def scenario():
+            grammar_server = GrammarServer()
+            grammar_server.validate = lambda request, deadline: 1 / len(
+                request["inputs"]
+            )
+            responses = [
+                await grammar_server.handle_request(json.dumps({"inputs": inputs}))
+                for inputs in ([], ["i"])
+            ]
+            grammar_server.close()
+            return responses
+
+        responses = asyncio.run(scenario())
+        self.assertIn("ZeroDivisionError", responses[0]["error"])
+        self.assertEqual(responses[1], 1.0)
+
+    def test_request_deadline(self):
+        # every input of a request stops at its deadline, not only the first
+        grammar_server = GrammarServer(limits=Limits())
+        request = {"grammar": EXPRESSION_GRAMMAR, "inputs": ["i+i"] * 3}
+        response = grammar_server.validate(request, time.monotonic() - 1)
+        self.assertEqual(response["verdicts"], [False] * 3)
+        self.assertEqual(response["limits"], ["time"] * 3)
+        response = grammar_server.validate(request, time.monotonic() + 60)
+        self.assertEqual(response["verdicts"], [True] * 3)
+        grammar_server.close()
+
+
+class TestStats(unittest.TestCase):
+    def test_phases_and_counters(self):
+        phases = []
+        stats = Stats(lambda phase, seconds: phases.append(phase))
+        grammar = Grammar.from_text(EXPRESSION_GRAMMAR, stats=stats)
+        self.assertEqual(
+            phases, ["lex", "parse_rules", "firsts", "follows", "rule_table", "expand"]
+        )
+        self.assertEqual(stats.counts["tokens"], 34)
+        # <E> -> <T>... -> <F>...
+        self.assertEqual(stats.counts["left_corner_depth"], 3)
+
+        self.assertEqual(list(grammar.parse_lines(["i+i", "(i"])), [True, False])
+        self.assertEqual(stats.counts["inputs"], 2)
+        self.assertEqual(stats.counts["accepted"], 1)
+        self.assertEqual(stats.counts["expansions"], sum(stats.production_hits))
+        self.assertEqual(stats.production_hits[:2], [3, 1])
+        self.assertEqual(stats.counts["max_stack"], 7)
+
+        grammar.check("i+i)")
+        self.assertEqual(stats.counts["recoveries_reset"], 1)
+        self.assertEqual(stats.counts["recoveries_skip"], 2)
+
+    def test_compile_grammar(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for hits in [0, 1]:
+                stats = Stats()
+                compile_grammar(EXPRESSION_GRAMMAR, directory, stats=stats)
+                self.assertEqual(stats.counts["table_cache_hits"], hits)
+                self.assertIn("load_table", stats.times)
+                self.assertEqual("parse_rules" in stats.times, not hits)
+
+    def test_left_corner_depth(self):
+        stats = Stats()
+        grammar_text = "<S> -> <A>b | c; <A> -> <B><C>; <B> -> \\e; <C> -> a;"
+        Grammar.from_text(grammar_text, stats=stats)
+        # <B> is nullable, so <C> is a left corner of <A> as well
+        self.assertEqual(stats.counts["left_corner_depth"], 3)
+
+    def test_every_entry_point(self):
+        table = Grammar.from_text(EXPRESSION_GRAMMAR).table
+        for limits in [None, Limits()]:
+            stats = Stats()
+            ll1_machine = LL1Machine(table=table, stats=stats, limits=limits)
+            self.assertTrue(ll1_machine.parse_stream(io.StringIO("i+i")))
+            self.assertFalse(ll1_machine.parse_bytes(b"(i"))
+            lines = ll1_machine.parse_byte_lines(b"i\n(i\ni*i\n")
+            self.assertEqual(list(map(bool, lines)), [True, False, True])
+            self.assertEqual(stats.counts["inputs"], 5)
+            self.assertEqual(stats.counts["accepted"], 3)
+            self.assertIn("machine", stats.times)
+
+        stats = Stats()
+        ll1_machine = LL1Machine(table=table, stats=stats)
+        derivation = ll1_machine.derive("i+i")
+        self.assertIsNone(ll1_machine.derive("i+"))
+        self.assertEqual(stats.counts["inputs"], 2)
+        self.assertEqual(stats.counts["accepted"], 1)
+        self.assertEqual(sum(stats.production_hits), stats.counts["expansions"])
+        self.assertGreaterEqual(stats.counts["expansions"], len(derivation.productions))
+
+    def test_results_unchanged(self):
+        grammar = Grammar.from_text(EXPRESSION_GRAMMAR)
+        traced = Grammar.from_text(EXPRESSION_GRAMMAR, stats=Stats())
+        for text in ["i+i*(i+i)", "(i", "i*i+i", "+i", ""]:
+            self.assertEqual(traced.parse(text), grammar.parse(text))
+            self.assertEqual(repr(traced.check(text)), repr(grammar.check(text)))
+
+
+class TestCodegen(unittest.TestCase):
+    def test_same_verdicts(self):
+        grammars = [
+            EXPRESSION_GRAMMAR,
+            "<S> -> <A><B>; <A> -> a | \\e; <B> -> b | \\e;",
+            SyntheticGrammar(30, 3, 4, 0.5).text(),
+        ]
+        for grammar_text in grammars:
+            grammar = Grammar.from_text(grammar_text)
+            parser = load_source(generate_source(grammar.table), "parser")
+            alphabet = grammar.table.terminals[1:] + ["$", "#"]
+            inputs = [""] + alphabet
+            inputs += [a + b + c for a in alphabet for b in alphabet for c in "(i)"]
+            for text in inputs:
+                self.assertEqual(parser.parse(text), grammar.parse(text), text)
+
+    def test_cached_module(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parser = load_parser(EXPRESSION_GRAMMAR, cache_dir)
+            path = parser.__file__
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(parser.GRAMMAR_HASH, grammar_hash(EXPRESSION_GRAMMAR))
+            os.utime(path, (0, 0))
+            parser = load_parser(EXPRESSION_GRAMMAR, cache_dir)
+            self.assertEqual(os.path.getmtime(path), 0)
+            self.assertEqual(
+                list(parser.parse_lines(["i+i\n", "(i\n", "i*(i)"])),
+                [True, False, True],
+            )
+
+    def test_invalid_grammar(self):
+        table = Grammar.from_text("<S> -> a | a<S>;").table
+        with self.assertRaises(InvalidLL1Grammar):
+            generate_source(table)
+
+
+class TestGrammarBuilder(unittest.TestCase):
+    def assertSameGrammar(self, built, text):
+        self.assertEqual(built.rules, text.rules)
+        self.assertEqual(built.analyze_table, text.analyze_table)
+        self.assertEqual(built.rule_table, text.rule_table)
+        self.assertEqual(built.valid_ll1, text.valid_ll1)
+        self.assertEqual(pickle.dumps(built.table), pickle.dumps(text.table))
+
+    def test_same_as_text(self):
+        rules = {
+            "E": [["<T>", "<E'>"]],
+            "E'": [["+", "<T>", "<E'>"], []],
+            "T": [["<F>", "<T'>"]],
+            "T'": [["*", "<F>", "<T'>"], []],
+            "F": [["(", "<E>", ")"], ["i"]],
+        }
+        text = Grammar.from_text(EXPRESSION_GRAMMAR)
+        self.assertSameGrammar(Grammar.from_dict(rules), text)
+        self.assertSameGrammar(Grammar.from_json(json.dumps(rules)), text)
+
+        builder = GrammarBuilder().add("<E>", ["<T>", "<E'>"])
+        builder.add("E'", ["+", "<T>", "<E'>"], []).add("T", ["<F>", "<T'>"])
+        builder.add("T'", ["*", "<F>", "<T'>"], [])
+        builder.add("F", ["(", "<E>", ")"], ["i"])
+        self.assertSameGrammar(Grammar.from_builder(builder), text)
+
+        for epsilon in (0.0, 0.5):
+            synthetic = SyntheticGrammar(60, 3, 4, epsilon, seed=5)
+            self.assertSameGrammar(
+                Grammar.from_dict(synthetic.as_dict(), compact=True),
+                Grammar.from_text(synthetic.text(), compact=True),
+            )
+
+    def test_invalid_rules(self):
+        for rules in [
+            [],
+            {"S": ["ab"]},
+            {"S": [["ab"]]},
+            {"S": [["<S"]]},
+            {"S": [[5]]},
+            {5: [["a"]]},
+            {"S": 5},
+            {"S": [5]},
+            {"S": [[None]]},
+        ]:
+            with self.assertRaises(ValueError):
+                GrammarBuilder.from_dict(rules)
+        with self.assertRaises(ValueError):
+            Grammar.from_dict({"S": [["$", "a"]]})
+        with self.assertRaises(LeftRecursion):
+            Grammar.from_dict({"S": [["<S>", "a"], ["b"]]})
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_grammars(self):
+        for epsilon in (0.0, 0.5, 1.0):
+            synthetic = SyntheticGrammar(40, 4, 6, epsilon, seed=3)
+            grammar = Grammar.from_text(synthetic.text())
+            self.assertTrue(grammar.valid_ll1)
+            for length in (1, 50, 500):
+                sentence = synthetic.sentence(length)
+                self.assertGreaterEqual(len(sentence), length)
+                self.assertTrue(grammar.parse(sentence))
+                self.assertFalse(grammar.parse(sentence + "#"))
+
+        # every non-terminal asked for is in the grammar, or it is refused
+        for depth in (2, 5, 50):
+            self.assertEqual(len(SyntheticGrammar(50, 3, depth).as_dict()), 51)
+        self.assertEqual(len(SyntheticGrammar(1, 3, 1).as_dict()), 2)
+        for non_terminals, depth in [(50, 1), (50, 51), (5, 0)]:
+            with self.assertRaises(ValueError):
+                SyntheticGrammar(non_terminals, 3, depth)
+
+    def test_bench_grammar(self):
+        result = bench_grammar(SyntheticGrammar(10), [100], repeat=1)
+        json.dumps(result)
+        self.assertEqual(
+            set(result["phases"]),
+            {"lex", "parse_rules", "build", "firsts", "follows", "rule_table"},
+        )
+        self.assertTrue(result["parse"][0]["accepted"])
+
+
 if __name__ == "__main__":
     unittest.main()